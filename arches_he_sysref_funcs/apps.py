@@ -9,5 +9,8 @@ class ArchesHeSysrefFuncsConfig(AppConfig):
     is_arches_application = True
 
     def ready(self):
+        # Connects the signal receivers that keep the function's metadata cache fresh
+        from arches_he_sysref_funcs.utils import metadata_cache  # noqa: F401
+
         if settings.APP_NAME.lower() == self.name:
             generate_frontend_configuration()
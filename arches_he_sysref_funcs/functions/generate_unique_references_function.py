@@ -1,12 +1,39 @@
-from uuid import UUID
 from arches.app.functions.base import BaseFunction
-from arches.app.models import models
 from arches.app.models.tile import Tile
-from arches.app.models.system_settings import settings
-from django.db import connection
+from arches.app.utils import task_management
+from django.db import transaction
+from arches_he_sysref_funcs import tasks
+from arches_he_sysref_funcs.references.allocation import (
+    PrimaryReferenceNumberBlock,
+    allocate_prns,
+    get_import_batch_size,
+    get_next_prn,
+    get_sequence_name,
+    import_prn_blocks,
+)
+from arches_he_sysref_funcs.references.config import (
+    GENERATE_UNIQUE_REFERENCES_FUNCTION_ID,
+    get_reference_nodegroup_graph,
+)
+from arches_he_sysref_funcs.references.registry import (
+    get_registry_entry,
+    register_references,
+    unregister_references,
+)
+from arches_he_sysref_funcs.references.repair import (
+    get_blank_reference_tile,
+    get_reference_tile_state,
+    populate_reference_data,
+    write_reference_tile,
+)
+from arches_he_sysref_funcs.utils.instrumentation import timed, timed_phase
+from arches_he_sysref_funcs.utils.metadata_cache import get_setting
+from arches_he_sysref_funcs.utils.profiling import profiled
 
 import logging
 
+logger = logging.getLogger(__name__)
+
 details = {
     "name": "Generate Unique References",
     "type": "node",
@@ -17,10 +44,11 @@ details = {
         "uniqueresource_nodegroup": "",
         "triggering_nodegroups": [],
         "nodegroup_nodes": [],
+        "sequence_name": "",
     },
     "classname": "GenerateUniqueReferences",
     "component": "views/components/functions/generate-unique-references-function",
-    "functionid": "39d627ae-6973-4ddb-8b62-1f0230e1e3f9",
+    "functionid": GENERATE_UNIQUE_REFERENCES_FUNCTION_ID,
 }
 
 
@@ -29,101 +57,17 @@ class GenerateUniqueReferences(BaseFunction):
     def get(self):
         raise NotImplementedError
 
+    @timed_phase("save")
+    @profiled(
+        lambda self, tile, *args, **kwargs: (
+            tile.resourceinstance_id,
+            tile.nodegroup_id,
+        )
+    )
     def save(self, tile, request, context=None):
         self.logger = logging.getLogger(__name__)
         try:
 
-            def create_simpleid_nextval_sequence(start=1):
-                try:
-                    with connection.cursor() as cursor:
-                        cursor.execute(
-                            """
-                            CREATE SEQUENCE IF NOT EXISTS simpleid_nextval_id_seq MINVALUE 1 START %s;
-                            """,
-                            [start],
-                        )
-                except Exception as ex:
-                    self.logger.error(f"Failed to create sequence: {ex}")
-                    raise
-
-            def get_current_sequence_number_from_database():
-                funcs = models.FunctionXGraph.objects.filter(
-                    function_id=details["functionid"]
-                )
-                nodeinfos = [
-                    {
-                        "simpleid": fn.config.get("simpleuid_node"),
-                        "unique_ng_id": fn.config.get("uniqueresource_nodegroup"),
-                    }
-                    for fn in funcs
-                    if "simpleuid_node" in fn.config
-                    and "uniqueresource_nodegroup" in fn.config
-                ]
-
-                if not nodeinfos:
-                    return None
-
-                sql_node_str = ", ".join("t.tiledata ->> %s::text" for _ in nodeinfos)
-                sql_nodegroups = tuple(ni["unique_ng_id"] for ni in nodeinfos)
-                sql_params = [str(ni["simpleid"]) for ni in nodeinfos] + [
-                    sql_nodegroups
-                ]
-
-                sql = f"""
-                    SELECT results.simple_id::int
-                    FROM (
-                        SELECT
-                            COALESCE({sql_node_str}, '0') AS simple_id
-                        FROM tiles t
-                        WHERE nodegroupid IN %s
-                    ) AS results
-                    ORDER BY results.simple_id::int DESC
-                    LIMIT 1
-                """
-
-                with connection.cursor() as cursor:
-                    cursor.execute(sql, sql_params)
-                    result = cursor.fetchone()
-                if result and result[0] is not None:
-                    try:
-                        return int(result[0])
-                    except (ValueError, TypeError):
-                        return None
-                return None
-
-            def get_next_simple_id():
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT EXISTS (
-                        SELECT FROM information_schema.sequences
-                        WHERE sequence_schema = 'public'
-                        AND sequence_name = 'simpleid_nextval_id_seq'
-                        );
-                        """
-                    )
-                    exists = cursor.fetchone()[0]
-                    if exists:
-                        cursor.execute("SELECT nextval('simpleid_nextval_id_seq');")
-                        return cursor.fetchone()[0]
-                    else:
-                        current_sequence_number = (
-                            get_current_sequence_number_from_database()
-                        )
-                        next_database_value = (
-                            current_sequence_number + 1
-                            if current_sequence_number is not None
-                            else 1
-                        )
-                        initial_sequence_number = max(
-                            getattr(
-                                settings, "PRIMARY_REFERENCE_NUMBER_INITIAL_SEED", 1
-                            ),
-                            next_database_value,
-                        )
-                        create_simpleid_nextval_sequence(start=initial_sequence_number)
-                        return get_next_simple_id()
-
             resourceIdValue = tile.resourceinstance_id
             simpleNode = self.config["simpleuid_node"]
             resourceIdNode = self.config["resourceid_node"]
@@ -132,61 +76,20 @@ class GenerateUniqueReferences(BaseFunction):
             def check_and_populate_uids(
                 currentTile, simpleid_node, resid_node, resourceidval
             ):
-                changes_made = False
-                language_code = settings.LANGUAGE_CODE
-                default_language_direction = models.Language.objects.get(
-                    code=language_code
-                ).default_direction
-
-                def populate_simple_id(currentTile, simple_node_id):
-                    try:
-                        nextsimpleval = get_next_simple_id()
-                        currentTile.data[simple_node_id] = nextsimpleval
-                    except Exception as ex:
-                        self.logger.error(f"Could not populate simple id: {ex}")
-                        raise
-
                 try:
-                    # Process simpleid
-                    current_simpleid_value = currentTile.data.get(simpleid_node, 0)
-                    if (
-                        not current_simpleid_value
-                        or not str(current_simpleid_value).isdigit()
-                    ):
-                        populate_simple_id(currentTile, simpleid_node)
-                        changes_made = True
-
-                    # Process resourceid
-                    resid_node_data = currentTile.data.get(resid_node) or {}
-                    en_data = resid_node_data.get(language_code) or {}
-                    resid_node_value = en_data.get("value")
-
-                    update_resid_node_tile = False
-                    if resid_node_value:
-                        try:
-                            UUID(resid_node_value)
-                            pass
-                        except:
-                            update_resid_node_tile = True
-                    else:
-                        update_resid_node_tile = True
-
-                    if update_resid_node_tile:
-                        changes_made = True
-                        currentTile.data[resid_node] = {
-                            language_code: {
-                                "value": str(resourceidval),
-                                "direction": default_language_direction,
-                            }
-                        }
-
-                    return changes_made
-
+                    return populate_reference_data(
+                        currentTile.data,
+                        simpleid_node,
+                        resid_node,
+                        resourceidval,
+                        lambda: get_next_prn(get_sequence_name(self.config)),
+                    )
                 except Exception as ex:
                     self.logger.error(str(ex))
                     return False
 
-            # User is creating a new System Reference tile explicitly
+            # User is creating a new System Reference tile explicitly, or a
+            # nested save of one. Its registry row is written in post_save().
             if str(tile.nodegroup_id) == refNodegroup:
                 check_and_populate_uids(
                     tile, simpleNode, resourceIdNode, resourceIdValue
@@ -194,45 +97,138 @@ class GenerateUniqueReferences(BaseFunction):
                 return
 
             # User saves another tile, and create system references if they do not exist
-            previously_saved_tiles = Tile.objects.filter(
-                nodegroup_id=refNodegroup, resourceinstance_id=resourceIdValue
-            )
+            with timed("reference_state"):
+                ref_tile_count, ref_tiles_complete = get_reference_tile_state(
+                    refNodegroup, simpleNode, resourceIdNode, resourceIdValue
+                )
+
+            # Most saves land here: the references are already in place
+            if ref_tiles_complete:
+                return
+
+            # Optionally write the reference tile directly instead of through a
+            # nested Tile.save(), leaving indexing to the save that triggered us
+            direct_writes = get_setting("SYSREF_DIRECT_TILE_WRITES", False)
+            graphId = get_reference_nodegroup_graph(refNodegroup)
+            user = getattr(request, "user", None)
 
             # There should only be one tile in this nodegroup per resource instance
-            if len(previously_saved_tiles) > 0:
+            if ref_tile_count > 0:
+                previously_saved_tiles = Tile.objects.filter(
+                    nodegroup_id=refNodegroup, resourceinstance_id=resourceIdValue
+                )
                 for p in previously_saved_tiles:
                     try:
+                        old_data = dict(p.data)
                         if (
                             check_and_populate_uids(
                                 p, simpleNode, resourceIdNode, resourceIdValue
                             )
                             == True
                         ):
-                            p.save()
+                            with timed("reference_tile_write"):
+                                if direct_writes:
+                                    write_reference_tile(
+                                        p,
+                                        graphId,
+                                        self.config,
+                                        old_value=old_data,
+                                        user=user,
+                                    )
+                                else:
+                                    p.save()
                     except Exception as ex:
                         self.logger.error(str(ex))
             else:
-                newRefTile = Tile().get_blank_tile_from_nodegroup_id(
-                    refNodegroup, resourceid=resourceIdValue, parenttile=None
-                )
+                newRefTile = get_blank_reference_tile(refNodegroup, resourceIdValue)
                 if (
                     check_and_populate_uids(
                         newRefTile, simpleNode, resourceIdNode, resourceIdValue
                     )
                     == True
                 ):
-                    newRefTile.save()
+                    with timed("reference_tile_write"):
+                        if direct_writes:
+                            write_reference_tile(
+                                newRefTile, graphId, self.config, user=user
+                            )
+                        else:
+                            newRefTile.save()
 
             return
 
         except Exception as ex:
             self.logger.error(str(ex))
 
+    def post_save(self, tile, request, context=None):
+        """
+        Registers the PRN of a saved System Reference tile. By now Tile.save()
+        has moved the edits of users who are not resource reviewers into
+        provisionaledits, so tile.data only holds approved references and an
+        unapproved PRN never resolves. The PRN may have been edited, so the
+        row is written whether or not save() populated anything.
+        """
+        ref_nodegroup = self.config["uniqueresource_nodegroup"]
+        if str(tile.nodegroup_id) != ref_nodegroup:
+            return
+
+        with timed("registry_write"):
+            entry = get_registry_entry(
+                tile, self.config, get_reference_nodegroup_graph(ref_nodegroup)
+            )
+            if entry is None:
+                unregister_references([tile.tileid])
+            else:
+                register_references([entry])
+
     def delete(self, tile, request):
         raise NotImplementedError
 
     def on_import(self, tile):
-        raise NotImplementedError
+        """
+        Completes a System Reference tile in Arches JSON business data before it
+        is imported. Arches calls this while validating the business data,
+        whether or not it goes on to import it, so PRNs are reserved in blocks
+        that start at one and double up to PRIMARY_REFERENCE_NUMBER_IMPORT_BATCH_SIZE:
+        a large load costs one sequence query per batch, while a small file or
+        a validation run leaves at most as many PRNs unused as it took.
+        Resources imported without a System Reference tile are picked up by
+        save(), or can be completed up front with populate_import_references().
+        """
+        if str(tile.get("nodegroup_id")) != self.config["uniqueresource_nodegroup"]:
+            return
 
-    def after_function_save(self, tile, request):
-        raise NotImplementedError
+        sequence_name = get_sequence_name(self.config)
+        populate_reference_data(
+            tile["data"],
+            self.config["simpleuid_node"],
+            self.config["resourceid_node"],
+            tile["resourceinstance_id"],
+            lambda: import_prn_blocks.get(
+                sequence_name, lambda: PrimaryReferenceNumberBlock(ramp=True)
+            ).take(
+                get_import_batch_size(),
+                lambda size: allocate_prns(size, sequence_name),
+            ),
+        )
+
+    def after_function_save(self, functionxgraph, request):
+        config = functionxgraph.config or {}
+        if not config.get("simpleuid_node") or not config.get(
+            "uniqueresource_nodegroup"
+        ):
+            return
+
+        # The index is built concurrently by a worker rather than in the
+        # request, where a long build would time out and leave it invalid
+        def build_prn_indexes():
+            if task_management.check_if_celery_available():
+                tasks.build_prn_indexes.delay()
+            else:
+                logger.warning(
+                    "Run 'python manage.py sysref_indexes' to build the Primary "
+                    "Reference Number index of graph %s",
+                    functionxgraph.graph_id,
+                )
+
+        transaction.on_commit(build_prn_indexes)
@@ -0,0 +1,248 @@
+"""
+Audits the System Reference tiles of every graph bound to the Generate Unique
+References function.
+"""
+
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from arches.app.models.system_settings import settings
+from arches_he_sysref_funcs.references.allocation import (
+    PRN_PATTERN,
+    get_sequence_name,
+)
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+
+CHECKS = [
+    "duplicate_prn",
+    "missing_prn",
+    "invalid_prn",
+    "mismatched_resourceid",
+    "missing_reference_tile",
+    "multiple_reference_tiles",
+]
+
+FIELDS = ["check", "graphid", "resourceinstanceid", "tileid", "prn", "detail"]
+
+
+class Command(BaseCommand):
+    """
+    Reports duplicate PRNs (among graphs that share a sequence), missing or
+    non-numeric PRNs, ResourceIDs that do not match the resource instance, and
+    resources without exactly one System Reference tile. Each check is a single
+    set-based query whose rows are streamed through a server-side cursor and
+    written out as CSV or JSON lines, one row per problem tile or resource.
+
+    """
+
+    help = "Reports duplicate, missing or invalid Primary Reference Numbers and ResourceIDs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-f",
+            "--format",
+            default="csv",
+            choices=["csv", "jsonl"],
+            help="Output format (default csv)",
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            default=None,
+            help="File to write the report to (default stdout)",
+        )
+        parser.add_argument(
+            "-g",
+            "--graph",
+            action="append",
+            dest="graphs",
+            default=[],
+            help="Limit the audit to this graphid (may be given more than once)",
+        )
+        parser.add_argument(
+            "-c",
+            "--check",
+            action="append",
+            dest="checks",
+            choices=CHECKS,
+            default=[],
+            help="Only run this check (may be given more than once; default all)",
+        )
+        parser.add_argument(
+            "-b",
+            "--chunk-size",
+            type=int,
+            default=settings.BULK_IMPORT_BATCH_SIZE,
+            help="Number of rows fetched from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        self.chunk_size = max(options["chunk_size"], 1)
+        checks = options["checks"] or CHECKS
+
+        configs = get_function_configs_by_graph()
+        if options["graphs"]:
+            configs = {
+                graph_id: config
+                for graph_id, config in configs.items()
+                if graph_id in options["graphs"]
+            }
+        if not configs:
+            self.stderr.write(
+                "No graphs are configured with Generate Unique References"
+            )
+            return
+
+        output = open(options["output"], "w", newline="") if options["output"] else None
+        try:
+            self.write_row = self.get_writer(output or self.stdout, options["format"])
+            counts = {check: 0 for check in checks}
+            for check in checks:
+                for row in getattr(self, check)(configs):
+                    self.write_row(dict(zip(FIELDS, (check,) + tuple(row))))
+                    counts[check] += 1
+        finally:
+            if output:
+                output.close()
+
+        for check, count in counts.items():
+            self.stderr.write(f"{check}: {count}")
+
+    def get_writer(self, stream, format):
+        if format == "jsonl":
+            return lambda row: stream.write(json.dumps(row) + "\n")
+
+        writer = csv.DictWriter(stream, fieldnames=FIELDS, lineterminator="\n")
+        writer.writeheader()
+        return writer.writerow
+
+    def stream(self, sql, params):
+        # A server-side cursor, so memory stays flat however many rows match
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def duplicate_prn(self, configs):
+        # PRNs only have to be unique among the graphs drawing from one sequence
+        by_sequence = {}
+        for graph_id, config in configs.items():
+            by_sequence.setdefault(get_sequence_name(config), []).append(
+                (graph_id, config)
+            )
+
+        for sequence_configs in by_sequence.values():
+            sql = " UNION ALL ".join(
+                """
+                SELECT %s::text, resourceinstanceid::text, tileid::text,
+                    (tiledata ->> %s::text)::bigint
+                FROM tiles
+                WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s
+                """
+                for _ in sequence_configs
+            )
+            params = []
+            for graph_id, config in sequence_configs:
+                simpleid_node = config["simpleuid_node"]
+                params += [
+                    graph_id,
+                    simpleid_node,
+                    config["uniqueresource_nodegroup"],
+                    simpleid_node,
+                    PRN_PATTERN,
+                ]
+            yield from self.stream(
+                f"""
+                SELECT graphid, resourceinstanceid, tileid, prn, copies::text
+                FROM (
+                    SELECT *, count(*) OVER (PARTITION BY prn) AS copies
+                    FROM ({sql}) AS refs(graphid, resourceinstanceid, tileid, prn)
+                ) AS counted
+                WHERE copies > 1
+                ORDER BY prn, resourceinstanceid;
+                """,
+                params,
+            )
+
+    def missing_prn(self, configs):
+        yield from self.invalid_prns(configs, missing=True)
+
+    def invalid_prn(self, configs):
+        yield from self.invalid_prns(configs, missing=False)
+
+    def invalid_prns(self, configs, missing):
+        for graph_id, config in configs.items():
+            simpleid_node = config["simpleuid_node"]
+            yield from self.stream(
+                f"""
+                SELECT %s::text, resourceinstanceid::text, tileid::text,
+                    tiledata ->> %s::text, NULL
+                FROM tiles
+                WHERE nodegroupid = %s::uuid
+                    AND nullif(tiledata ->> %s::text, '') IS {"" if missing else "NOT"} NULL
+                    AND NOT coalesce(
+                        (tiledata ->> %s::text) ~ %s AND tiledata -> %s::text <> '0'::jsonb,
+                        false
+                    );
+                """,
+                [
+                    graph_id,
+                    simpleid_node,
+                    config["uniqueresource_nodegroup"],
+                    simpleid_node,
+                    simpleid_node,
+                    PRN_PATTERN,
+                    simpleid_node,
+                ],
+            )
+
+    def mismatched_resourceid(self, configs):
+        for graph_id, config in configs.items():
+            yield from self.stream(
+                """
+                SELECT %s::text, resourceinstanceid::text, tileid::text,
+                    tiledata ->> %s::text, resourceid
+                FROM (
+                    SELECT *, tiledata -> %s::text -> %s::text ->> 'value' AS resourceid
+                    FROM tiles
+                    WHERE nodegroupid = %s::uuid
+                ) AS refs
+                WHERE resourceid IS DISTINCT FROM resourceinstanceid::text;
+                """,
+                [
+                    graph_id,
+                    config["simpleuid_node"],
+                    config["resourceid_node"],
+                    settings.LANGUAGE_CODE,
+                    config["uniqueresource_nodegroup"],
+                ],
+            )
+
+    def missing_reference_tile(self, configs):
+        yield from self.reference_tile_counts(configs, "= 0")
+
+    def multiple_reference_tiles(self, configs):
+        yield from self.reference_tile_counts(configs, "> 1")
+
+    def reference_tile_counts(self, configs, condition):
+        for graph_id, config in configs.items():
+            yield from self.stream(
+                f"""
+                SELECT %s::text, r.resourceinstanceid::text, NULL, NULL,
+                    count(t.tileid)::text
+                FROM resource_instances r
+                LEFT JOIN tiles t
+                    ON t.resourceinstanceid = r.resourceinstanceid
+                    AND t.nodegroupid = %s::uuid
+                WHERE r.graphid = %s::uuid
+                GROUP BY r.resourceinstanceid
+                HAVING count(t.tileid) {condition};
+                """,
+                [graph_id, config["uniqueresource_nodegroup"], graph_id],
+            )
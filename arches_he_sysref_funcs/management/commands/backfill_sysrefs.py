@@ -0,0 +1,202 @@
+"""
+Creates or repairs System Reference tiles for resources that were saved before
+the Generate Unique References function was added to their graph.
+"""
+
+import json
+import os
+import time
+import uuid
+import multiprocessing
+from collections import deque
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from arches.app.models import models
+from arches.app.models.system_settings import settings
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+from arches_he_sysref_funcs.references.repair import repair_reference_tiles
+
+
+def init_worker():
+    django.setup()
+
+
+def backfill_chunk(graph_id, config, resourceinstanceids, dry_run, transaction_id):
+    created, repaired = repair_reference_tiles(
+        graph_id,
+        config,
+        resourceinstanceids,
+        dry_run=dry_run,
+        transaction_id=transaction_id,
+    )
+    return len(resourceinstanceids), created, repaired, str(resourceinstanceids[-1])
+
+
+class Command(BaseCommand):
+    """
+    Walks the resources of every graph bound to the Generate Unique References
+    function, in resourceinstanceid order, and creates or repairs their System
+    Reference tiles a chunk at a time.
+
+    """
+
+    help = "Generates missing Primary Reference Numbers and ResourceIDs for existing resources"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-g",
+            "--graph",
+            action="append",
+            dest="graphs",
+            default=[],
+            help="Limit the backfill to this graphid (may be given more than once)",
+        )
+        parser.add_argument(
+            "-b",
+            "--chunk-size",
+            type=int,
+            default=settings.BULK_IMPORT_BATCH_SIZE,
+            help="Number of resources processed per chunk; each chunk allocates its PRNs in one query",
+        )
+        parser.add_argument(
+            "-p",
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to spread chunks across (default 1, no pool)",
+        )
+        parser.add_argument(
+            "-c",
+            "--checkpoint",
+            default=None,
+            help="Path to a JSON checkpoint file; a rerun resumes after the last completed chunk of each graph",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Report how many tiles would be created or repaired without allocating PRNs or writing tiles",
+        )
+
+    def handle(self, *args, **options):
+        self.chunk_size = max(options["chunk_size"], 1)
+        self.processes = max(options["processes"], 1)
+        self.dry_run = options["dry_run"]
+        self.checkpoint_path = options["checkpoint"]
+        self.checkpoint = self.load_checkpoint()
+        self.transaction_id = uuid.uuid4()
+
+        configs = get_function_configs_by_graph()
+        if options["graphs"]:
+            configs = {
+                graph_id: config
+                for graph_id, config in configs.items()
+                if graph_id in options["graphs"]
+            }
+        if not configs:
+            self.stdout.write(
+                "No graphs are configured with Generate Unique References"
+            )
+            return
+
+        pool = None
+        if self.processes > 1:
+            # Workers must open their own database connections
+            connections.close_all()
+            pool = multiprocessing.Pool(
+                processes=self.processes, initializer=init_worker
+            )
+
+        try:
+            for graph_id, config in configs.items():
+                self.backfill_graph(graph_id, config, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if not self.dry_run:
+            self.stdout.write(
+                f"Backfill transaction id: {self.transaction_id}. "
+                "Reindex the affected resources to make new references searchable."
+            )
+
+    def backfill_graph(self, graph_id, config, pool):
+        graph_name = models.GraphModel.objects.get(pk=graph_id).name
+        resourceinstances = models.ResourceInstance.objects.filter(graph_id=graph_id)
+        last_completed = self.checkpoint.get(graph_id)
+        if last_completed:
+            self.stdout.write(f"{graph_name}: resuming after {last_completed}")
+            resourceinstances = resourceinstances.filter(
+                resourceinstanceid__gt=last_completed
+            )
+
+        # iterator() streams through a server-side cursor, so memory stays flat
+        resourceinstanceids = (
+            resourceinstances.order_by("resourceinstanceid")
+            .values_list("resourceinstanceid", flat=True)
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+        totals = {"resources": 0, "created": 0, "repaired": 0}
+        start = time.monotonic()
+
+        def record(result):
+            count, created, repaired, last_resourceinstanceid = result
+            totals["resources"] += count
+            totals["created"] += created
+            totals["repaired"] += repaired
+            if not self.dry_run:
+                self.checkpoint[graph_id] = last_resourceinstanceid
+                self.save_checkpoint()
+            elapsed = max(time.monotonic() - start, 1e-6)
+            self.stdout.write(
+                f"{graph_name}: {totals['resources']} resources, "
+                f"{totals['created']} tiles {'to create' if self.dry_run else 'created'}, "
+                f"{totals['repaired']} {'to repair' if self.dry_run else 'repaired'} "
+                f"({totals['resources'] / elapsed:.0f} rows/sec)"
+            )
+
+        # Results are collected in submission order so that the checkpoint only
+        # ever moves past chunks that have completed
+        in_flight = deque()
+        for chunk in self.chunks(resourceinstanceids):
+            args = (graph_id, config, chunk, self.dry_run, self.transaction_id)
+            if pool is None:
+                record(backfill_chunk(*args))
+                continue
+            in_flight.append(pool.apply_async(backfill_chunk, args))
+            if len(in_flight) >= self.processes * 2:
+                record(in_flight.popleft().get())
+        while in_flight:
+            record(in_flight.popleft().get())
+
+        if totals["resources"] == 0:
+            self.stdout.write(f"{graph_name}: nothing to do")
+
+    def chunks(self, iterable):
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def load_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        return {}
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,47 @@
+"""
+Builds the sysref registry from the System Reference tiles already stored.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+from arches_he_sysref_funcs.references.registry import build_sysref_registry
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the registry rows of every configured graph, or of the graphs
+    given, from their System Reference tiles in a single transaction. Run it
+    after loading tiles outside the function, e.g. with
+    populate_import_references() or a business data import. Tiles whose PRN
+    is already registered to another tile are skipped and counted; run
+    audit_sysrefs to list them.
+
+    """
+
+    help = "Rebuilds the sysref registry from the stored System Reference tiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-g",
+            "--graph",
+            action="append",
+            dest="graphs",
+            default=[],
+            help="Only rebuild the rows of this graphid (may be given more than once)",
+        )
+
+    def handle(self, *args, **options):
+        graphs = options["graphs"] or None
+        if graphs:
+            unknown = set(graphs) - set(get_function_configs_by_graph())
+            if unknown:
+                raise CommandError(
+                    f"Not configured with Generate Unique References: {', '.join(sorted(unknown))}"
+                )
+
+        for graph_id, (registered, skipped) in build_sysref_registry(graphs).items():
+            message = f"{graph_id}: registered {registered} references"
+            if skipped:
+                message += f", skipped {skipped} duplicate PRNs"
+            self.stdout.write(message)
@@ -0,0 +1,111 @@
+"""
+Rebuilds this app's custom Elasticsearch indexes.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arches.app.models.system_settings import settings
+from arches.app.search.base_index import get_index
+from arches_he_sysref_funcs.search_indexes import bulk_reindex
+
+
+def get_app_index_names():
+    return [
+        index["name"]
+        for index in settings.ELASTICSEARCH_CUSTOM_INDEXES
+        if index["module"].startswith("arches_he_sysref_funcs.")
+    ]
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds each custom index of this app registered in
+    ELASTICSEARCH_CUSTOM_INDEXES, or those given. Resource ids are streamed
+    from a server-side cursor a chunk at a time; each chunk's tiles are loaded
+    in one query, its documents built in a pool worker and sent to
+    Elasticsearch in one bulk request. Throughput is reported after every
+    chunk and for each index.
+
+    """
+
+    help = "Rebuilds this app's custom Elasticsearch indexes in parallel bulk chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-i",
+            "--index",
+            action="append",
+            dest="indexes",
+            default=[],
+            help="Only rebuild the custom index with this name (may be given more than once)",
+        )
+        parser.add_argument(
+            "-g",
+            "--graph",
+            action="append",
+            dest="graphs",
+            default=[],
+            help="Only reindex the resources of this graphid (may be given more than once)",
+        )
+        parser.add_argument(
+            "-b",
+            "--chunk-size",
+            type=int,
+            default=settings.BULK_IMPORT_BATCH_SIZE,
+            help="Number of resources loaded and sent to Elasticsearch per chunk",
+        )
+        parser.add_argument(
+            "-p",
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to spread chunks across (default 1, no pool)",
+        )
+        parser.add_argument(
+            "--keep-existing",
+            action="store_true",
+            default=False,
+            help="Update the documents in place rather than deleting and recreating each index first",
+        )
+
+    def handle(self, *args, **options):
+        index_names = get_app_index_names()
+        if options["indexes"]:
+            unknown = set(options["indexes"]) - set(index_names)
+            if unknown:
+                raise CommandError(
+                    f"Not a custom index of this app: {', '.join(sorted(unknown))}"
+                )
+            index_names = [name for name in index_names if name in options["indexes"]]
+        if not index_names:
+            self.stdout.write("No custom indexes of this app are registered")
+            return
+
+        failures = 0
+        for index_name in index_names:
+            failures += self.reindex(index_name, options)
+        if failures:
+            raise CommandError(f"{failures} documents could not be indexed")
+
+    def reindex(self, index_name, options):
+        def progress(indexed, failed, elapsed):
+            self.stdout.write(
+                f"{index_name}: {indexed} documents indexed, {failed} failed "
+                f"({indexed / max(elapsed, 1e-6):.0f} docs/sec)"
+            )
+
+        indexed, failed, elapsed = bulk_reindex.reindex(
+            get_index(index_name),
+            graphids=options["graphs"] or None,
+            # Recreating the index would drop the documents of other graphs
+            clear_index=not (options["keep_existing"] or options["graphs"]),
+            chunk_size=max(options["chunk_size"], 1),
+            processes=max(options["processes"], 1),
+            progress=progress,
+        )
+        self.stdout.write(
+            f"{index_name}: indexed {indexed} documents"
+            f"{f', {failed} failed' if failed else ''} in {elapsed:.1f}s "
+            f"({indexed / max(elapsed, 1e-6):.0f} docs/sec)"
+        )
+        return failed
@@ -0,0 +1,75 @@
+"""
+Moves the Primary Reference Number sequences past the PRNs already stored.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from arches_he_sysref_funcs.references.allocation import (
+    SIMPLEID_SEQUENCE_NAME,
+    SequenceAllocator,
+    get_allocator,
+    get_sequence_registry,
+    resync_sequence,
+)
+
+
+class Command(BaseCommand):
+    """
+    Sets each PRN sequence used by a configured graph (and the shared
+    simpleid_nextval_id_seq) to follow the highest PRN stored in the
+    nodegroups it numbers, found with the same indexed query used to seed a
+    new sequence. Sequences are only ever moved forward, so the command is
+    cheap and safe to run as a deploy hook.
+
+    """
+
+    help = "Moves the Primary Reference Number sequences past the highest stored PRN"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s",
+            "--sequence",
+            action="append",
+            dest="sequences",
+            default=[],
+            help="Only resync this sequence (may be given more than once)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Report the gaps that would be closed without changing any sequence",
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(get_allocator(), SequenceAllocator):
+            raise CommandError(
+                "PRNs are not allocated from sequences with the configured "
+                "SYSREF_PRN_ALLOCATOR, so there is nothing to resync"
+            )
+
+        sequences = sorted({SIMPLEID_SEQUENCE_NAME, *get_sequence_registry()})
+        if options["sequences"]:
+            unknown = set(options["sequences"]) - set(sequences)
+            if unknown:
+                raise CommandError(
+                    f"Not a configured PRN sequence: {', '.join(sorted(unknown))}"
+                )
+            sequences = options["sequences"]
+
+        verb = "would be" if options["dry_run"] else "was"
+        for sequence_name in sequences:
+            before, after = resync_sequence(sequence_name, dry_run=options["dry_run"])
+            if before is None:
+                self.stdout.write(
+                    f"{sequence_name}: missing, {verb} created starting at {after}"
+                )
+            elif after > before:
+                self.stdout.write(
+                    f"{sequence_name}: next value {before} {verb} moved to {after}, "
+                    f"closing a gap of {after - before}"
+                )
+            else:
+                self.stdout.write(
+                    f"{sequence_name}: already past the highest PRN (next value {before})"
+                )
@@ -0,0 +1,52 @@
+"""
+Manages the expression indexes used to seed the Primary Reference Number sequence.
+"""
+
+from django.core.management.base import BaseCommand
+
+from arches_he_sysref_funcs.references.allocation import (
+    create_prn_indexes,
+    drop_prn_indexes,
+)
+
+
+class Command(BaseCommand):
+    """
+    Creates or drops a partial expression index on the numeric Primary Reference
+    Number of each System Reference nodegroup configured for the Generate Unique
+    References function. Creating rebuilds any index left invalid by a failed
+    concurrent build and drops the indexes of nodes no longer configured.
+
+    """
+
+    help = "Creates or drops the Primary Reference Number indexes for configured graphs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "operation",
+            nargs="?",
+            default="create",
+            choices=["create", "drop"],
+            help="'create'=Creates any missing or invalid PRN indexes (default); 'drop'=Drops the PRN indexes",
+        )
+        parser.add_argument(
+            "--blocking",
+            action="store_true",
+            default=False,
+            help="Build or drop the indexes inside a transaction rather than concurrently",
+        )
+
+    def handle(self, *args, **options):
+        concurrently = not options["blocking"]
+        if options["operation"] == "drop":
+            for name in drop_prn_indexes(concurrently=concurrently):
+                self.stdout.write(f"Dropped {name}")
+            return
+
+        built, dropped = create_prn_indexes(concurrently=concurrently)
+        for name in built:
+            self.stdout.write(f"Created {name}")
+        for name in dropped:
+            self.stdout.write(f"Dropped {name}")
+        if not built and not dropped:
+            self.stdout.write("The PRN indexes are up to date")
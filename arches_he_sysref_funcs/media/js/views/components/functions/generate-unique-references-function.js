@@ -15,6 +15,11 @@ define([
             this.triggering_nodegroups = params.config.triggering_nodegroups;
             this.simpleuid_node = params.config.simpleuid_node;
             this.resourceid_node = params.config.resourceid_node;
+            // Configs saved before sequence_name was added do not have it
+            if (!ko.isObservable(params.config.sequence_name)) {
+                params.config.sequence_name = ko.observable(params.config.sequence_name || "");
+            }
+            this.sequence_name = params.config.sequence_name;
             this.nodesList = [];
 
             this.graph.nodes.forEach((node) => {
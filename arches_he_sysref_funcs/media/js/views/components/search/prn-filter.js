@@ -0,0 +1,63 @@
+define([
+    'knockout',
+    'views/components/search/base-filter',
+    'templates/views/components/search/prn-filter.htm',
+], function(ko, BaseFilter, prnFilterTemplate) {
+    const componentName = 'prn-filter';
+    const viewModel = BaseFilter.extend({
+        initialize: function(options) {
+            options.name = 'Primary Reference Number Filter';
+            BaseFilter.prototype.initialize.call(this, options);
+            // PRNs and ranges separated by commas or spaces, e.g. "1001, 2000-2100"
+            this.filter = {
+                query: ko.observable(''),
+                inverted: ko.observable(false)
+            };
+            var filterUpdated = ko.computed(function() {
+                return ko.toJSON(this.filter);
+            }, this);
+            filterUpdated.subscribe(function() {
+                this.updateQuery();
+            }, this);
+
+            this.searchFilterVms[componentName](this);
+
+            if (this.searchViewFiltersLoaded() === false) {
+                this.searchViewFiltersLoaded.subscribe(function() {
+                    this.restoreState();
+                }, this);
+            } else {
+                this.restoreState();
+            }
+        },
+
+        updateQuery: function() {
+            var queryObj = this.query();
+            if (this.filter.query().trim()) {
+                queryObj[componentName] = ko.toJSON(this.filter);
+            } else {
+                delete queryObj[componentName];
+            }
+            this.query(queryObj);
+        },
+
+        restoreState: function() {
+            var query = this.query();
+            if (componentName in query) {
+                var prnQuery = JSON.parse(query[componentName]);
+                this.filter.inverted(!!prnQuery.inverted);
+                this.filter.query(prnQuery.query || '');
+            }
+        },
+
+        clear: function() {
+            this.filter.inverted(false);
+            this.filter.query('');
+        }
+    });
+
+    return ko.components.register(componentName, {
+        viewModel: viewModel,
+        template: prnFilterTemplate,
+    });
+});
@@ -26,6 +26,7 @@ class Migration(migrations.Migration):
                     "resourceid_node": "",
                     "triggering_nodegroups": [],
                     "uniqueresource_nodegroup": "",
+                    "sequence_name": "",
                 },
                 "classname": "GenerateUniqueReferences",
                 "component": "views/components/functions/generate-unique-references-function",
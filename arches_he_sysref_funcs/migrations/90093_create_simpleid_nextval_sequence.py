@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db import migrations
+
+# Migrations keep their own copies of these rather than importing the function
+# module, so that later changes to it cannot break a fresh migrate
+GENERATE_UNIQUE_REFERENCES_FUNCTION_ID = "39d627ae-6973-4ddb-8b62-1f0230e1e3f9"
+SIMPLEID_SEQUENCE_NAME = "simpleid_nextval_id_seq"
+PRN_PATTERN = "^[0-9]{1,18}$"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "arches_he_sysref_funcs",
+            "90092_initial_generate_unique_refererences_function",
+        ),
+    ]
+
+    def create_sequence(apps, schema_editor):
+        """
+        Creates the shared PRN sequence, seeded past any PRNs already stored
+        in the System Reference nodegroups that draw from it.
+        """
+        FunctionXGraph = apps.get_model("models", "FunctionXGraph")
+
+        if getattr(settings, "PRIMARY_REFERENCE_NUMBER_SEQUENCE_PER_GRAPH", False):
+            configs = []
+        else:
+            configs = [
+                fn.config
+                for fn in FunctionXGraph.objects.filter(
+                    function_id=GENERATE_UNIQUE_REFERENCES_FUNCTION_ID
+                )
+                if fn.config
+                and fn.config.get("simpleuid_node")
+                and fn.config.get("uniqueresource_nodegroup")
+                and not fn.config.get("sequence_name")
+            ]
+
+        with schema_editor.connection.cursor() as cursor:
+            current = None
+            if configs:
+                sql = " UNION ALL ".join(
+                    """
+                    SELECT max((tiledata ->> %s::text)::bigint)
+                    FROM tiles
+                    WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s
+                    """
+                    for _ in configs
+                )
+                params = []
+                for config in configs:
+                    simpleid_node = config["simpleuid_node"]
+                    params += [
+                        simpleid_node,
+                        config["uniqueresource_nodegroup"],
+                        simpleid_node,
+                        PRN_PATTERN,
+                    ]
+                cursor.execute(
+                    f"SELECT max(simple_id) FROM ({sql}) AS results(simple_id)",
+                    params,
+                )
+                current = cursor.fetchone()[0]
+
+            start = max(
+                getattr(settings, "PRIMARY_REFERENCE_NUMBER_INITIAL_SEED", 1),
+                int(current) + 1 if current is not None else 1,
+            )
+            cursor.execute(
+                f"CREATE SEQUENCE IF NOT EXISTS {SIMPLEID_SEQUENCE_NAME} MINVALUE 1 START %s;",
+                [start],
+            )
+
+    operations = [
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Migrations keep their own copies of these rather than importing the function
+# module, so that later changes to it cannot break a fresh migrate
+GENERATE_UNIQUE_REFERENCES_FUNCTION_ID = "39d627ae-6973-4ddb-8b62-1f0230e1e3f9"
+PRN_PATTERN = "^[0-9]{1,18}$"
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built concurrently, which cannot happen inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("arches_he_sysref_funcs", "90093_create_simpleid_nextval_sequence"),
+    ]
+
+    def create_indexes(apps, schema_editor):
+        """
+        Creates the partial expression index on the numeric PRNs of every
+        configured System Reference nodegroup.
+        """
+        FunctionXGraph = apps.get_model("models", "FunctionXGraph")
+
+        prn_nodes = {
+            (
+                str(fn.config["simpleuid_node"]),
+                str(fn.config["uniqueresource_nodegroup"]),
+            )
+            for fn in FunctionXGraph.objects.filter(
+                function_id=GENERATE_UNIQUE_REFERENCES_FUNCTION_ID
+            )
+            if fn.config
+            and fn.config.get("simpleuid_node")
+            and fn.config.get("uniqueresource_nodegroup")
+        }
+        with schema_editor.connection.cursor() as cursor:
+            for simpleid_node, nodegroup_id in sorted(prn_nodes):
+                cursor.execute(
+                    f"""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS
+                        sysref_prn_{nodegroup_id.replace("-", "")}_idx
+                    ON tiles (((tiledata ->> %s::text)::bigint))
+                    WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s;
+                    """,
+                    [simpleid_node, nodegroup_id, simpleid_node, PRN_PATTERN],
+                )
+
+    operations = [
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_he_sysref_funcs", "90094_create_prn_indexes"),
+        ("models", "11499_add_editlog_resourceinstance_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SysrefRegistry",
+            fields=[
+                (
+                    "tile",
+                    models.OneToOneField(
+                        db_column="tileid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sysref_registry",
+                        serialize=False,
+                        to="models.tilemodel",
+                    ),
+                ),
+                ("prn", models.BigIntegerField()),
+                ("sequence_name", models.TextField()),
+                ("resourceinstanceid", models.UUIDField(db_index=True)),
+                ("graphid", models.UUIDField()),
+            ],
+            options={
+                "db_table": "sysref_registry",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("prn", "sequence_name"),
+                        name="sysref_registry_prn_unique",
+                    )
+                ],
+            },
+        ),
+    ]
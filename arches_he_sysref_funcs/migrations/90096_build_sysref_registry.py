@@ -0,0 +1,74 @@
+import re
+
+from django.conf import settings
+from django.db import migrations
+
+# Migrations keep their own copies of these rather than importing the function
+# module, so that later changes to it cannot break a fresh migrate
+GENERATE_UNIQUE_REFERENCES_FUNCTION_ID = "39d627ae-6973-4ddb-8b62-1f0230e1e3f9"
+SIMPLEID_SEQUENCE_NAME = "simpleid_nextval_id_seq"
+SEQUENCE_NAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_]{0,62}$")
+PRN_PATTERN = "^[0-9]{1,18}$"
+
+
+def get_sequence_name(config):
+    sequence_name = config.get("sequence_name")
+    if sequence_name:
+        if not SEQUENCE_NAME_PATTERN.match(sequence_name):
+            raise ValueError(f"Invalid PRN sequence name: {sequence_name!r}")
+        return sequence_name
+    if getattr(settings, "PRIMARY_REFERENCE_NUMBER_SEQUENCE_PER_GRAPH", False):
+        nodegroup_id = str(config["uniqueresource_nodegroup"]).replace("-", "")
+        return f"sysref_prn_{nodegroup_id}_seq"
+    return SIMPLEID_SEQUENCE_NAME
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_he_sysref_funcs", "90095_sysrefregistry"),
+    ]
+
+    def build_registry(apps, schema_editor):
+        """
+        Registers the System Reference tiles already stored. Where several
+        tiles hold the same PRN in a sequence only the first is registered.
+        """
+        FunctionXGraph = apps.get_model("models", "FunctionXGraph")
+
+        configs = {
+            str(fn.graph_id): fn.config
+            for fn in FunctionXGraph.objects.filter(
+                function_id=GENERATE_UNIQUE_REFERENCES_FUNCTION_ID
+            )
+            if fn.config
+            and fn.config.get("simpleuid_node")
+            and fn.config.get("uniqueresource_nodegroup")
+        }
+        with schema_editor.connection.cursor() as cursor:
+            for graph_id, config in configs.items():
+                simpleid_node = config["simpleuid_node"]
+                cursor.execute(
+                    """
+                    INSERT INTO sysref_registry
+                        (tileid, prn, sequence_name, resourceinstanceid, graphid)
+                    SELECT tileid, (tiledata ->> %s::text)::bigint, %s,
+                        resourceinstanceid, %s::uuid
+                    FROM tiles
+                    WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s
+                    ORDER BY tileid
+                    ON CONFLICT DO NOTHING;
+                    """,
+                    [
+                        simpleid_node,
+                        get_sequence_name(config),
+                        graph_id,
+                        config["uniqueresource_nodegroup"],
+                        simpleid_node,
+                        PRN_PATTERN,
+                    ],
+                )
+
+    operations = [
+        migrations.RunPython(build_registry, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+PRN_FILTER_ID = "012c999c-79e3-4c91-aee0-c608024b49a2"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_he_sysref_funcs", "90096_build_sysref_registry"),
+    ]
+
+    def add_search_component(apps, schema_editor):
+        SearchComponent = apps.get_model("models", "SearchComponent")
+
+        SearchComponent.objects.update_or_create(
+            searchcomponentid=PRN_FILTER_ID,
+            defaults={
+                "name": "Primary Reference Number Filter",
+                "icon": "fa fa-hashtag",
+                "modulename": "prn_filter.py",
+                "classname": "PrnFilter",
+                "type": "prn-filter-type",
+                "componentpath": "views/components/search/prn-filter",
+                "componentname": "prn-filter",
+                "config": {},
+            },
+        )
+
+        # Search filters are only run when the search view links them
+        for search_view in SearchComponent.objects.filter(
+            componentname="standard-search-view"
+        ):
+            linked_filters = search_view.config.get("linkedSearchFilters", [])
+            if not any(
+                linked_filter["searchcomponentid"] == PRN_FILTER_ID
+                for linked_filter in linked_filters
+            ):
+                linked_filters.append(
+                    {
+                        "componentname": "prn-filter",
+                        "searchcomponentid": PRN_FILTER_ID,
+                        "layoutSortorder": 11,
+                    }
+                )
+                search_view.config["linkedSearchFilters"] = linked_filters
+                search_view.save()
+
+    def remove_search_component(apps, schema_editor):
+        SearchComponent = apps.get_model("models", "SearchComponent")
+
+        for search_view in SearchComponent.objects.filter(
+            componentname="standard-search-view"
+        ):
+            search_view.config["linkedSearchFilters"] = [
+                linked_filter
+                for linked_filter in search_view.config.get("linkedSearchFilters", [])
+                if linked_filter["searchcomponentid"] != PRN_FILTER_ID
+            ]
+            search_view.save()
+
+        SearchComponent.objects.filter(pk=PRN_FILTER_ID).delete()
+
+    operations = [
+        migrations.RunPython(add_search_component, remove_search_component),
+    ]
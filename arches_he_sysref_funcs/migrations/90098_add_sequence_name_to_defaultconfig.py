@@ -0,0 +1,28 @@
+from django.db import migrations
+
+GENERATE_UNIQUE_REFERENCES_FUNCTION_ID = "39d627ae-6973-4ddb-8b62-1f0230e1e3f9"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_he_sysref_funcs", "90097_register_prn_search_filter"),
+    ]
+
+    def add_sequence_name(apps, schema_editor):
+        Function = apps.get_model("models", "Function")
+
+        for fn in Function.objects.filter(pk=GENERATE_UNIQUE_REFERENCES_FUNCTION_ID):
+            fn.defaultconfig.setdefault("sequence_name", "")
+            fn.save()
+
+    def remove_sequence_name(apps, schema_editor):
+        Function = apps.get_model("models", "Function")
+
+        for fn in Function.objects.filter(pk=GENERATE_UNIQUE_REFERENCES_FUNCTION_ID):
+            fn.defaultconfig.pop("sequence_name", None)
+            fn.save()
+
+    operations = [
+        migrations.RunPython(add_sequence_name, remove_sequence_name),
+    ]
@@ -0,0 +1,36 @@
+from django.db import models
+
+from arches.app.models.models import TileModel
+
+
+class SysrefRegistry(models.Model):
+    """
+    One row per System Reference tile, holding its Primary Reference Number
+    and resource outside of the tile JSON so that PRNs can be resolved and
+    checked with indexed lookups. Maintained by the Generate Unique References
+    function and rebuilt with the build_sysref_registry command.
+
+    There is no database constraint on the tile, so tiles deleted outside the
+    ORM can leave rows behind until the registry is rebuilt.
+    """
+
+    tile = models.OneToOneField(
+        TileModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column="tileid",
+        db_constraint=False,
+        related_name="sysref_registry",
+    )
+    prn = models.BigIntegerField()
+    sequence_name = models.TextField()
+    resourceinstanceid = models.UUIDField(db_index=True)
+    graphid = models.UUIDField()
+
+    class Meta:
+        db_table = "sysref_registry"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["prn", "sequence_name"], name="sysref_registry_prn_unique"
+            )
+        ]
@@ -0,0 +1,613 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from django.db import ProgrammingError, connection, transaction
+from django.utils.module_loading import import_string
+
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+from arches_he_sysref_funcs.utils.instance_registry import InstanceRegistry
+from arches_he_sysref_funcs.utils.instrumentation import timed, timed_phase
+from arches_he_sysref_funcs.utils.metadata_cache import get_setting, metadata_cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PrimaryReferenceNumberBlock:
+    """
+    Process-local pool of Primary Reference Numbers reserved from the database
+    sequence a block at a time and handed out from memory.
+
+    Enabled by setting PRIMARY_REFERENCE_NUMBER_BLOCK_SIZE above 1. Numbers left
+    in a block when a worker exits are never used, so the sequence of PRNs will
+    contain gaps.
+    """
+
+    def __init__(self, ramp=False):
+        self._lock = threading.Lock()
+        self._values = deque()
+        self._pid = os.getpid()
+        self._ramp = ramp
+        self._next_size = 1
+
+    def take(self, size, fetch):
+        """
+        Returns the next reserved number, calling fetch(size) to reserve a new
+        block of numbers when the current one is exhausted. A ramped block
+        reserves one number first and doubles on each refill up to size, so
+        that it never holds more unused numbers than it has handed out.
+        """
+        with self._lock:
+            # A forked worker must not hand out numbers reserved by its parent
+            if self._pid != os.getpid():
+                self._values.clear()
+                self._next_size = 1
+                self._pid = os.getpid()
+            if not self._values:
+                if self._ramp:
+                    size, self._next_size = (
+                        min(size, self._next_size),
+                        min(size, self._next_size * 2),
+                    )
+                self._values.extend(sorted(fetch(size)))
+            return self._values.popleft()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._next_size = 1
+
+
+# Reserved PRNs for saves, one block per sequence
+prn_blocks = InstanceRegistry()
+
+# PRNs reserved for tiles completed by on_import, one ramped block per sequence
+import_prn_blocks = InstanceRegistry()
+
+
+SIMPLEID_SEQUENCE_NAME = "simpleid_nextval_id_seq"
+
+# Sequences this process has already seen answer nextval, so the hot path can
+# skip the catalog lookup and go straight to the sequence.
+known_sequences = set()
+
+# Sequence names are interpolated into DDL, so only plain identifiers are allowed
+SEQUENCE_NAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_]{0,62}$")
+
+
+def get_sequence_name(config):
+    """
+    Returns the name of the sequence a function config allocates PRNs from: the
+    config's sequence_name if set, otherwise a sequence of its own System
+    Reference nodegroup when PRIMARY_REFERENCE_NUMBER_SEQUENCE_PER_GRAPH is
+    enabled, otherwise the shared simpleid_nextval_id_seq.
+    """
+    sequence_name = config.get("sequence_name")
+    if sequence_name:
+        if not SEQUENCE_NAME_PATTERN.match(sequence_name):
+            raise ValueError(f"Invalid PRN sequence name: {sequence_name!r}")
+        return sequence_name
+    if get_setting("PRIMARY_REFERENCE_NUMBER_SEQUENCE_PER_GRAPH", False):
+        nodegroup_id = str(config["uniqueresource_nodegroup"]).replace("-", "")
+        return f"sysref_prn_{nodegroup_id}_seq"
+    return SIMPLEID_SEQUENCE_NAME
+
+
+def get_sequence_registry():
+    """
+    Returns {sequence name: [(PRN nodeid, System Reference nodegroupid), ...]}
+    for every configured graph, i.e. which nodegroups each sequence numbers and
+    so must be scanned to seed it.
+    """
+
+    def load():
+        registry = {}
+        for config in get_function_configs_by_graph().values():
+            nodes = registry.setdefault(get_sequence_name(config), set())
+            nodes.add(
+                (str(config["simpleuid_node"]), str(config["uniqueresource_nodegroup"]))
+            )
+        return {name: sorted(nodes) for name, nodes in registry.items()}
+
+    return metadata_cache.get("sequence_registry", load)
+
+
+# How long a worker waits for another worker to create a missing sequence or
+# counter table. The lock is held until the creating transaction commits, which
+# can include the rest of a tile save.
+SEQUENCE_BOOTSTRAP_ATTEMPTS = 100
+SEQUENCE_BOOTSTRAP_INTERVAL = 0.05
+
+
+def create_simpleid_nextval_sequence(start=1, sequence_name=SIMPLEID_SEQUENCE_NAME):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE SEQUENCE IF NOT EXISTS {sequence_name} MINVALUE 1 START %s;
+                """,
+                [start],
+            )
+    except Exception as ex:
+        logger.error(f"Failed to create sequence: {ex}")
+        raise
+
+
+# Only values matching this pattern are treated as PRNs by the seeding query and
+# the expression indexes that serve it; the length cap keeps the bigint cast safe.
+PRN_PATTERN = "^[0-9]{1,18}$"
+PRN_RE = re.compile(PRN_PATTERN)
+
+
+def get_prn_nodes(sequence_name=None):
+    """
+    Returns the distinct (PRN nodeid, System Reference nodegroupid) pairs
+    configured across every graph bound to the function, or only those numbered
+    from sequence_name.
+    """
+    if sequence_name is not None:
+        return get_sequence_registry().get(sequence_name, [])
+    return sorted(
+        {
+            (str(config["simpleuid_node"]), str(config["uniqueresource_nodegroup"]))
+            for config in get_function_configs_by_graph().values()
+        }
+    )
+
+
+def get_prn_index_name(simpleid_node):
+    return f"sysref_prn_{str(simpleid_node).replace('-', '')}_idx"
+
+
+def get_prn_index_states():
+    """
+    Returns whether each PRN index on the tiles table is valid, keyed by name.
+    A concurrent build that failed or was cancelled leaves an invalid index
+    behind, which is kept up to date by writes but never used by queries.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            r"""
+            SELECT index_class.relname, pg_index.indisvalid
+            FROM pg_index
+            JOIN pg_class AS index_class ON index_class.oid = pg_index.indexrelid
+            WHERE pg_index.indrelid = 'tiles'::regclass
+                AND index_class.relname LIKE 'sysref\_prn\_%\_idx';
+            """
+        )
+        return dict(cursor.fetchall())
+
+
+def create_prn_index(simpleid_node, nodegroup_id, concurrently=False):
+    """
+    Creates a partial expression index on the numeric PRN values of one System
+    Reference nodegroup, which lets the seeding query find the max PRN as an
+    index-only lookup, rebuilding it if it was left invalid. The predicate must
+    stay in step with the WHERE clause in
+    get_current_sequence_number_from_database().
+
+    Returns whether the index was built.
+    """
+    name = get_prn_index_name(simpleid_node)
+    valid = get_prn_index_states().get(name)
+    if valid:
+        return False
+    if valid is not None:
+        drop_prn_index(name, concurrently=concurrently)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE INDEX {"CONCURRENTLY" if concurrently else ""} IF NOT EXISTS {name}
+            ON tiles (((tiledata ->> %s::text)::bigint))
+            WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s;
+            """,
+            [simpleid_node, nodegroup_id, simpleid_node, PRN_PATTERN],
+        )
+    return True
+
+
+def drop_prn_index(name, concurrently=False):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DROP INDEX {'CONCURRENTLY' if concurrently else ''} IF EXISTS {name};"
+        )
+
+
+def create_prn_indexes(concurrently=False):
+    """
+    Creates the PRN index of every configured System Reference node, rebuilding
+    any that are invalid, and drops those of nodes that are no longer
+    configured. Returns the names of the indexes built and of those dropped.
+    """
+    prn_nodes = get_prn_nodes()
+    built = [
+        get_prn_index_name(simpleid_node)
+        for simpleid_node, nodegroup_id in prn_nodes
+        if create_prn_index(simpleid_node, nodegroup_id, concurrently=concurrently)
+    ]
+    names = {get_prn_index_name(simpleid_node) for simpleid_node, _ in prn_nodes}
+    dropped = sorted(set(get_prn_index_states()) - names)
+    for name in dropped:
+        drop_prn_index(name, concurrently=concurrently)
+    return built, dropped
+
+
+def drop_prn_indexes(concurrently=False):
+    """
+    Drops every PRN index on the tiles table. Returns their names.
+    """
+    names = sorted(get_prn_index_states())
+    for name in names:
+        drop_prn_index(name, concurrently=concurrently)
+    return names
+
+
+@timed_phase("seed_scan")
+def get_current_sequence_number_from_database(sequence_name=SIMPLEID_SEQUENCE_NAME):
+    nodeinfos = get_prn_nodes(sequence_name)
+
+    if not nodeinfos:
+        return None
+
+    # One max() per nodegroup, each matching the predicate of that nodegroup's
+    # partial index so it resolves with a backward index scan.
+    sql = " UNION ALL ".join(
+        """
+        SELECT max((tiledata ->> %s::text)::bigint)
+        FROM tiles
+        WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s
+        """
+        for _ in nodeinfos
+    )
+    sql_params = []
+    for simpleid_node, nodegroup_id in nodeinfos:
+        sql_params += [simpleid_node, nodegroup_id, simpleid_node, PRN_PATTERN]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT max(simple_id) FROM ({sql}) AS results(simple_id)", sql_params
+        )
+        result = cursor.fetchone()
+    if result and result[0] is not None:
+        return int(result[0])
+    return None
+
+
+def get_initial_sequence_number(sequence_name=SIMPLEID_SEQUENCE_NAME):
+    current_sequence_number = get_current_sequence_number_from_database(sequence_name)
+    next_database_value = (
+        current_sequence_number + 1 if current_sequence_number is not None else 1
+    )
+    return max(
+        get_setting("PRIMARY_REFERENCE_NUMBER_INITIAL_SEED", 1),
+        next_database_value,
+    )
+
+
+def relation_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", [name])
+    return cursor.fetchone()[0]
+
+
+def create_once(lock_name, exists, create):
+    """
+    Single-flight creation of a database object: unless exists(cursor) is
+    already true, the worker holding a transaction-level advisory lock on
+    lock_name calls create(), while concurrent workers poll, a bounded number
+    of times, until they can see the result.
+    """
+    with connection.cursor() as cursor:
+        for _ in range(SEQUENCE_BOOTSTRAP_ATTEMPTS):
+            with transaction.atomic():
+                if exists(cursor):
+                    return
+                cursor.execute(
+                    "SELECT pg_try_advisory_xact_lock(hashtext(%s));",
+                    [f"sysref:{lock_name}"],
+                )
+                if cursor.fetchone()[0]:
+                    # Another worker may have committed it since the check above
+                    if not exists(cursor):
+                        create()
+                    return
+            time.sleep(SEQUENCE_BOOTSTRAP_INTERVAL)
+    raise RuntimeError(f"Timed out waiting for {lock_name} to be created")
+
+
+@timed_phase("sequence_bootstrap")
+def ensure_simpleid_nextval_sequence(sequence_name=SIMPLEID_SEQUENCE_NAME):
+    """
+    Creates a PRN sequence, seeded past any existing PRNs in the nodegroups it
+    numbers, if it does not already exist. Called when the sequence is missing; the
+    app's migrations create the shared sequence in the same way with their own
+    copy of the query.
+
+    Bootstrap is single-flight: only the worker holding the advisory lock runs
+    the seeding query and creates the sequence.
+    """
+    create_once(
+        sequence_name,
+        lambda cursor: relation_exists(cursor, sequence_name),
+        lambda: create_simpleid_nextval_sequence(
+            start=get_initial_sequence_number(sequence_name),
+            sequence_name=sequence_name,
+        ),
+    )
+    known_sequences.add(sequence_name)
+
+
+def get_sequence_next_value(cursor, sequence_name):
+    cursor.execute(
+        f"SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM {sequence_name};"
+    )
+    return cursor.fetchone()[0]
+
+
+def resync_sequence(sequence_name=SIMPLEID_SEQUENCE_NAME, dry_run=False):
+    """
+    Moves a PRN sequence forward past the highest PRN stored in the nodegroups
+    it numbers (or to PRIMARY_REFERENCE_NUMBER_INITIAL_SEED if that is higher),
+    e.g. after a restore or a legacy import. The sequence is never moved back.
+    A missing sequence is created. Runs under the same advisory lock as
+    sequence creation, so it is safe to run while saves are in progress.
+
+    Returns (next value before, next value after); equal if nothing changed.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtext(%s));", [f"sysref:{sequence_name}"]
+        )
+        # Found before the sequence is locked, so that saves are only held up
+        # for the compare and set below rather than the seeding query
+        target = get_initial_sequence_number(sequence_name)
+        if not relation_exists(cursor, sequence_name):
+            if not dry_run:
+                create_simpleid_nextval_sequence(target, sequence_name=sequence_name)
+                known_sequences.add(sequence_name)
+            return None, target
+
+        if not dry_run:
+            # ALTER SEQUENCE blocks nextval until this transaction ends, so no
+            # value can be handed out between reading the sequence and moving
+            # it, and a concurrent nextval can never be undone. NO CYCLE is
+            # how the sequence was created, so nothing else changes.
+            cursor.execute(f"ALTER SEQUENCE {sequence_name} NO CYCLE;")
+        current = get_sequence_next_value(cursor, sequence_name)
+        if target <= current:
+            return current, current
+        if not dry_run:
+            cursor.execute("SELECT setval(%s, %s, false);", [sequence_name, target])
+        return current, target
+
+
+@timed_phase("nextval")
+def _nextval(count, sequence_name):
+    """
+    Returns count values from a sequence, or None if it does not exist. The
+    name is looked up with to_regclass() so a missing sequence does not raise,
+    which would abort the enclosing transaction (e.g. Tile.save()'s).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(to_regclass(%s)) FROM generate_series(1, %s);",
+            [sequence_name, count],
+        )
+        values = [row[0] for row in cursor.fetchall()]
+    return None if None in values else values
+
+
+def fetch_simple_ids(count=1, sequence_name=SIMPLEID_SEQUENCE_NAME):
+    """
+    Returns count new values from a PRN sequence in a single round trip. The
+    catalog check and creation path are only taken when the sequence is
+    missing, on first use or after it was dropped (e.g. by a restore).
+    """
+    values = _nextval(count, sequence_name)
+    if values is None:
+        known_sequences.discard(sequence_name)
+        ensure_simpleid_nextval_sequence(sequence_name)
+        values = _nextval(count, sequence_name)
+        if values is None:
+            raise RuntimeError(f"PRN sequence {sequence_name} could not be created")
+    known_sequences.add(sequence_name)
+    return values
+
+
+class PrimaryReferenceNumberAllocator:
+    """
+    Hands out new Primary Reference Numbers. The backend is chosen with the
+    SYSREF_PRN_ALLOCATOR setting; see get_allocator().
+    """
+
+    def allocate(self, count, sequence_name):
+        """
+        Returns a list of count new, unique PRNs from the named sequence.
+        """
+        raise NotImplementedError
+
+
+class SequenceAllocator(PrimaryReferenceNumberAllocator):
+    """
+    Draws PRNs from a PostgreSQL sequence, created on first use. nextval never
+    blocks and is not rolled back, so PRNs of rolled back saves are skipped.
+    """
+
+    def allocate(self, count, sequence_name):
+        return fetch_simple_ids(count, sequence_name)
+
+
+PRN_COUNTER_TABLE = "sysref_prn_counters"
+
+
+class CounterTableAllocator(PrimaryReferenceNumberAllocator):
+    """
+    Draws PRNs from rows of the sysref_prn_counters table. Each sequence is
+    split across SYSREF_PRN_COUNTER_SHARDS rows (default 4) that hand out
+    interleaved numbers, and each allocation claims a row that no other
+    transaction holds with FOR UPDATE SKIP LOCKED. The row stays locked until
+    the save commits, so numbers of rolled back saves are reused rather than
+    skipped, while concurrent saves spread across the other rows. PRNs are
+    unique but not issued in strictly increasing order.
+    """
+
+    def __init__(self, shards=None):
+        self.shards = shards or int(get_setting("SYSREF_PRN_COUNTER_SHARDS", 4) or 1)
+        self.known_counters = set()
+
+    def allocate(self, count, sequence_name):
+        if sequence_name not in self.known_counters:
+            self.ensure_counters(sequence_name)
+            self.known_counters.add(sequence_name)
+        try:
+            # Fall back to waiting for a row if every one is in use
+            row = self.claim(count, sequence_name, skip_locked=True) or self.claim(
+                count, sequence_name, skip_locked=False
+            )
+        except ProgrammingError:
+            self.known_counters.discard(sequence_name)
+            raise
+        if row is None:
+            self.known_counters.discard(sequence_name)
+            raise RuntimeError(f"No PRN counters found for {sequence_name}")
+        start, step = row
+        return [start + i * step for i in range(count)]
+
+    def claim(self, count, sequence_name, skip_locked):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH shard AS (
+                    SELECT shard FROM {PRN_COUNTER_TABLE}
+                    WHERE sequence_name = %s
+                    ORDER BY random() LIMIT 1
+                    FOR UPDATE {"SKIP LOCKED" if skip_locked else ""}
+                )
+                UPDATE {PRN_COUNTER_TABLE} AS counters
+                SET next_value = counters.next_value + counters.step * %s
+                FROM shard
+                WHERE counters.sequence_name = %s AND counters.shard = shard.shard
+                RETURNING counters.next_value - counters.step * %s, counters.step;
+                """,
+                [sequence_name, count, sequence_name, count],
+            )
+            return cursor.fetchone()
+
+    @timed_phase("counter_bootstrap")
+    def ensure_counters(self, sequence_name):
+        def exists(cursor):
+            if not relation_exists(cursor, PRN_COUNTER_TABLE):
+                return False
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {PRN_COUNTER_TABLE} WHERE sequence_name = %s);",
+                [sequence_name],
+            )
+            return cursor.fetchone()[0]
+
+        def create():
+            start = get_initial_sequence_number(sequence_name)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {PRN_COUNTER_TABLE} (
+                        sequence_name text NOT NULL,
+                        shard integer NOT NULL,
+                        step integer NOT NULL,
+                        next_value bigint NOT NULL,
+                        PRIMARY KEY (sequence_name, shard)
+                    );
+                    """
+                )
+                cursor.execute(
+                    f"""
+                    INSERT INTO {PRN_COUNTER_TABLE} (sequence_name, shard, step, next_value)
+                    SELECT %s, shard, %s, %s + shard FROM generate_series(0, %s - 1) AS shard
+                    ON CONFLICT DO NOTHING;
+                    """,
+                    [sequence_name, self.shards, start, self.shards],
+                )
+
+        # One lock for the whole table, which is created on first use
+        create_once(PRN_COUNTER_TABLE, exists, create)
+
+
+class InMemoryAllocator(PrimaryReferenceNumberAllocator):
+    """
+    Hands out PRNs from counters held in this process, starting at
+    PRIMARY_REFERENCE_NUMBER_INITIAL_SEED, without touching the database.
+    Numbers are only unique within one process and restart with it, so this is
+    for unit tests and benchmarks only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def allocate(self, count, sequence_name):
+        with self._lock:
+            start = self._counters.get(sequence_name)
+            if start is None:
+                start = get_setting("PRIMARY_REFERENCE_NUMBER_INITIAL_SEED", 1)
+            self._counters[sequence_name] = start + count
+        return list(range(start, start + count))
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+PRN_ALLOCATORS = {
+    "sequence": SequenceAllocator,
+    "counter_table": CounterTableAllocator,
+    "memory": InMemoryAllocator,
+}
+
+_allocators = InstanceRegistry()
+
+
+def get_allocator():
+    """
+    Returns the allocator named by the SYSREF_PRN_ALLOCATOR setting: "sequence"
+    (the default), "counter_table", "memory" or the dotted path of a
+    PrimaryReferenceNumberAllocator subclass. One instance is kept per process.
+    """
+    name = get_setting("SYSREF_PRN_ALLOCATOR", "sequence") or "sequence"
+    return _allocators.get(
+        name, lambda: (PRN_ALLOCATORS.get(name) or import_string(name))()
+    )
+
+
+def allocate_prns(count, sequence_name=SIMPLEID_SEQUENCE_NAME):
+    """
+    Returns a list of count new Primary Reference Numbers, fetched from the
+    configured allocator in a single database round trip. Use
+    get_sequence_name() to find the sequence of a graph's function config.
+    """
+    if count <= 0:
+        return []
+    with timed("allocate"):
+        return get_allocator().allocate(count, sequence_name)
+
+
+def get_next_prn(sequence_name=SIMPLEID_SEQUENCE_NAME):
+    """
+    Returns one new Primary Reference Number, taken from this process's
+    reserved block when PRIMARY_REFERENCE_NUMBER_BLOCK_SIZE is above 1.
+    """
+    block_size = int(get_setting("PRIMARY_REFERENCE_NUMBER_BLOCK_SIZE", 1) or 1)
+    if block_size > 1:
+        return prn_blocks.get(sequence_name, PrimaryReferenceNumberBlock).take(
+            block_size, lambda size: allocate_prns(size, sequence_name)
+        )
+    return allocate_prns(1, sequence_name)[0]
+
+
+def is_valid_prn(value):
+    return bool(value) and str(value).isdigit()
+
+
+def get_import_batch_size():
+    return int(get_setting("PRIMARY_REFERENCE_NUMBER_IMPORT_BATCH_SIZE", 1000) or 1)
@@ -0,0 +1,42 @@
+from arches.app.models import models
+from arches_he_sysref_funcs.utils.metadata_cache import metadata_cache
+
+GENERATE_UNIQUE_REFERENCES_FUNCTION_ID = "39d627ae-6973-4ddb-8b62-1f0230e1e3f9"
+
+
+def get_function_configs_by_graph():
+    """
+    Returns the function config of every graph bound to the function, keyed by
+    graphid, leaving out configs without a PRN node or System Reference
+    nodegroup.
+    """
+
+    def load():
+        return {
+            str(fn.graph_id): fn.config
+            for fn in models.FunctionXGraph.objects.filter(
+                function_id=GENERATE_UNIQUE_REFERENCES_FUNCTION_ID
+            )
+            if fn.config
+            and fn.config.get("simpleuid_node")
+            and fn.config.get("uniqueresource_nodegroup")
+        }
+
+    return metadata_cache.get("function_configs", load)
+
+
+def get_reference_nodegroup_graph(ref_nodegroup):
+    """
+    Returns the graphid of the graph whose System Reference nodegroup is
+    ref_nodegroup, from the cached function configs.
+    """
+
+    def load():
+        return {
+            str(config["uniqueresource_nodegroup"]): graph_id
+            for graph_id, config in get_function_configs_by_graph().items()
+        }
+
+    return metadata_cache.get("reference_nodegroup_graphs", load).get(
+        str(ref_nodegroup)
+    )
@@ -0,0 +1,336 @@
+from itertools import islice
+from uuid import UUID
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from arches_he_sysref_funcs.references.allocation import (
+    PRN_PATTERN,
+    PRN_RE,
+    get_sequence_name,
+    is_valid_prn,
+)
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+from arches_he_sysref_funcs.utils.instance_registry import InstanceRegistry
+from arches_he_sysref_funcs.utils.lru_cache import LRUCache
+from arches_he_sysref_funcs.utils.metadata_cache import get_setting
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+SYSREF_REGISTRY_TABLE = "sysref_registry"
+
+
+def get_registry_entry(tile, config, graph_id):
+    """
+    Returns the sysref registry row of a System Reference tile as a
+    (tileid, prn, sequence_name, resourceinstanceid, graphid) tuple, or None if
+    the tile does not hold a PRN that fits in a bigint.
+    """
+    prn = (tile.data or {}).get(config["simpleuid_node"])
+    if not is_valid_prn(prn) or len(str(prn)) > 18:
+        return None
+    return (
+        str(tile.tileid),
+        int(prn),
+        get_sequence_name(config),
+        str(tile.resourceinstance_id),
+        str(graph_id),
+    )
+
+
+def register_references(entries):
+    """
+    Writes sysref registry rows, as returned by get_registry_entry(), replacing
+    any rows the tiles already have. Called inside the transaction that writes
+    the System Reference tiles, so the registry never disagrees with committed
+    tiles written by the function. A PRN already registered to another tile in
+    the same sequence, even by a concurrent save, is logged and left out
+    rather than failing the save, and the tile is left unregistered;
+    audit_sysrefs reports the duplicate tiles. Returns the number of rows
+    written.
+    """
+    unique = {}
+    seen = set()
+    for entry in entries:
+        if entry is None or entry[0] in unique:
+            continue
+        if (entry[1], entry[2]) in seen:
+            logger.warning(f"PRN {entry[1]} is not unique in {entry[2]}")
+            continue
+        seen.add((entry[1], entry[2]))
+        unique[entry[0]] = entry
+    if not unique:
+        return 0
+
+    with connection.cursor() as cursor:
+        # The old rows are deleted rather than upserted so that a tile whose
+        # PRN changed to one registered elsewhere stops resolving under its
+        # old PRN, and so that ON CONFLICT DO NOTHING covers the PRN
+        # constraint as well as the tileid
+        cursor.execute(
+            f"DELETE FROM {SYSREF_REGISTRY_TABLE} WHERE tileid = ANY(%s::uuid[]);",
+            [list(unique)],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {SYSREF_REGISTRY_TABLE}
+                (tileid, prn, sequence_name, resourceinstanceid, graphid)
+            SELECT * FROM unnest(
+                %s::uuid[], %s::bigint[], %s::text[], %s::uuid[], %s::uuid[]
+            )
+            ON CONFLICT DO NOTHING
+            RETURNING tileid::text;
+            """,
+            [list(column) for column in zip(*unique.values())],
+        )
+        written = {row[0] for row in cursor.fetchall()}
+
+    for tileid, entry in unique.items():
+        if tileid not in written:
+            logger.warning(
+                f"PRN {entry[1]} of tile {tileid} is already registered to another tile in {entry[2]}"
+            )
+    return len(written)
+
+
+def unregister_references(tileids):
+    """
+    Removes the sysref registry rows of the given tiles, e.g. of a System
+    Reference tile whose PRN is no longer valid.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SYSREF_REGISTRY_TABLE} WHERE tileid = ANY(%s::uuid[]);",
+            [[str(tileid) for tileid in tileids]],
+        )
+
+
+def build_sysref_registry(graph_ids=None):
+    """
+    Rebuilds the sysref registry from the System Reference tiles of the given
+    graphs (default every configured graph) with one set-based query per
+    graph, in a single transaction. Where several tiles hold the same PRN in a
+    sequence only the first is registered.
+
+    Returns {graphid: (registered, skipped)}, where skipped counts the tiles
+    left out as duplicates.
+    """
+    configs = get_function_configs_by_graph()
+    if graph_ids is not None:
+        selected = {str(graph_id) for graph_id in graph_ids}
+        configs = {
+            graph_id: config
+            for graph_id, config in configs.items()
+            if graph_id in selected
+        }
+
+    results = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        if graph_ids is None:
+            cursor.execute(f"DELETE FROM {SYSREF_REGISTRY_TABLE};")
+        else:
+            cursor.execute(
+                f"DELETE FROM {SYSREF_REGISTRY_TABLE} WHERE graphid = ANY(%s::uuid[]);",
+                [list(configs)],
+            )
+        for graph_id, config in configs.items():
+            simpleid_node = config["simpleuid_node"]
+            cursor.execute(
+                f"""
+                WITH refs AS (
+                    SELECT tileid, (tiledata ->> %s::text)::bigint AS prn,
+                        resourceinstanceid
+                    FROM tiles
+                    WHERE nodegroupid = %s::uuid AND (tiledata ->> %s::text) ~ %s
+                ), registered AS (
+                    INSERT INTO {SYSREF_REGISTRY_TABLE}
+                        (tileid, prn, sequence_name, resourceinstanceid, graphid)
+                    SELECT tileid, prn, %s, resourceinstanceid, %s::uuid
+                    FROM refs
+                    ORDER BY tileid
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM registered), (SELECT count(*) FROM refs);
+                """,
+                [
+                    simpleid_node,
+                    config["uniqueresource_nodegroup"],
+                    simpleid_node,
+                    PRN_PATTERN,
+                    get_sequence_name(config),
+                    graph_id,
+                ],
+            )
+            registered, found = cursor.fetchone()
+            results[graph_id] = (registered, found - registered)
+    return results
+
+
+_resolve_caches = InstanceRegistry()
+
+
+def get_resolve_cache_timeout():
+    return get_setting("SYSREF_RESOLVE_CACHE_TIMEOUT", 300)
+
+
+def get_resolve_cache():
+    """
+    Returns this process's LRU cache of resolved PRNs, holding up to
+    SYSREF_RESOLVE_CACHE_SIZE entries (default 10000, 0 to disable) for
+    SYSREF_RESOLVE_CACHE_TIMEOUT seconds (default 300, None to never expire).
+    """
+    key = (
+        int(get_setting("SYSREF_RESOLVE_CACHE_SIZE", 10000) or 0),
+        get_resolve_cache_timeout(),
+    )
+    return _resolve_caches.get(key, lambda: LRUCache(*key))
+
+
+def get_shared_resolve_cache():
+    """
+    Returns the Django cache named by SYSREF_RESOLVE_CACHE_ALIAS, shared by
+    every worker, or None when the setting is not set.
+    """
+    alias = get_setting("SYSREF_RESOLVE_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def lookup_prns(prns):
+    """
+    Returns {prn: [entry, ...]} for those of the given PRNs found in the sysref
+    registry, in one query. Each entry is a dict of prn, resourceinstanceid,
+    graphid and sequence_name.
+    """
+    found = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT prn, resourceinstanceid::text, graphid::text, sequence_name
+            FROM {SYSREF_REGISTRY_TABLE}
+            WHERE prn = ANY(%s::bigint[])
+            ORDER BY prn, sequence_name;
+            """,
+            [[int(prn) for prn in prns]],
+        )
+        for prn, resourceinstanceid, graph_id, sequence_name in cursor.fetchall():
+            found.setdefault(prn, []).append(
+                {
+                    "prn": prn,
+                    "resourceinstanceid": resourceinstanceid,
+                    "graphid": graph_id,
+                    "sequence_name": sequence_name,
+                }
+            )
+    return found
+
+
+def resolve_prn(prn, sequence_name=None):
+    """
+    Returns the sysref registry entries of a PRN (see lookup_prns()), only
+    those of one sequence if sequence_name is given. A PRN has more than one
+    entry only when graphs draw from separate sequences.
+
+    Found PRNs are cached in the process (see get_resolve_cache()) and in the
+    shared cache if there is one (see get_shared_resolve_cache()), so a PRN
+    that is edited or deleted can keep resolving to its old resource for up to
+    SYSREF_RESOLVE_CACHE_TIMEOUT seconds. Unknown PRNs are not cached.
+    """
+    prn = int(prn)
+    local = get_resolve_cache()
+    entries = local.get(prn)
+    if entries is None:
+        shared = get_shared_resolve_cache()
+        key = f"sysref:resolve:{prn}"
+        entries = shared.get(key) if shared is not None else None
+        if entries is None:
+            entries = lookup_prns([prn]).get(prn, [])
+            if entries and shared is not None:
+                shared.set(key, entries, get_resolve_cache_timeout())
+        if entries:
+            local.set(prn, entries)
+
+    return [
+        dict(entry)
+        for entry in entries
+        if sequence_name is None or entry["sequence_name"] == sequence_name
+    ]
+
+
+RESOLVE_BY = ("prn", "resourceinstanceid")
+
+
+def resolve_reference_groups(values, by="prn", sequence_name=None, chunk_size=1000):
+    """
+    Resolves PRNs to their resources, or with by="resourceinstanceid" resources
+    to their PRNs, from the sysref registry. values can be any iterable, e.g. a
+    file or request body, and is read chunk_size values at a time with one
+    query per chunk, so memory stays flat however many values are given.
+
+    Yields, in input order, (value, entries) for each value as given, where
+    entries lists its matches (see lookup_prns()) with "found": True, and is
+    empty for a value that is unknown or not a valid PRN or UUID. A PRN can
+    match once per sequence and a resource once per System Reference tile.
+    """
+    if by not in RESOLVE_BY:
+        raise ValueError(f"Cannot resolve by {by}, only by {' or '.join(RESOLVE_BY)}")
+    column_type = "bigint" if by == "prn" else "uuid"
+    values = iter(values)
+
+    def parse(value):
+        try:
+            if by == "prn":
+                return int(value) if PRN_RE.match(str(value)) else None
+            return str(UUID(str(value)))
+        except ValueError:
+            return None
+
+    while True:
+        chunk = [(value, parse(value)) for value in islice(values, chunk_size)]
+        if not chunk:
+            break
+
+        found = {}
+        keys = list({key for _, key in chunk if key is not None})
+        if keys:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT prn, resourceinstanceid::text, graphid::text, sequence_name
+                    FROM {SYSREF_REGISTRY_TABLE}
+                    WHERE {by} = ANY(%s::{column_type}[])
+                        AND (%s::text IS NULL OR sequence_name = %s::text)
+                    ORDER BY prn, sequence_name;
+                    """,
+                    [keys, sequence_name, sequence_name],
+                )
+                for prn, resourceinstanceid, graph_id, sequence in cursor.fetchall():
+                    entry = {
+                        "prn": prn,
+                        "resourceinstanceid": resourceinstanceid,
+                        "graphid": graph_id,
+                        "sequence_name": sequence,
+                        "found": True,
+                    }
+                    found.setdefault(entry[by], []).append(entry)
+
+        for value, key in chunk:
+            yield value, [dict(entry) for entry in found.get(key, [])]
+
+
+def resolve_references(values, by="prn", sequence_name=None, chunk_size=1000):
+    """
+    Resolves values as resolve_reference_groups() does, yielding in input
+    order an entry per match, or {by: value, "found": False} for a value that
+    is unknown or not a valid PRN or UUID.
+    """
+    for value, entries in resolve_reference_groups(
+        values, by=by, sequence_name=sequence_name, chunk_size=chunk_size
+    ):
+        if entries:
+            yield from entries
+        else:
+            yield {by: value, "found": False}
@@ -0,0 +1,468 @@
+import datetime
+from collections import Counter
+from uuid import UUID, uuid4
+
+from arches.app.models import models
+from arches.app.models.tile import Tile
+from arches.app.models.system_settings import settings
+from django.db import connection, transaction
+
+from arches_he_sysref_funcs.references.allocation import (
+    PRN_PATTERN,
+    allocate_prns,
+    get_sequence_name,
+    is_valid_prn,
+)
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+from arches_he_sysref_funcs.references.registry import (
+    get_registry_entry,
+    register_references,
+)
+from arches_he_sysref_funcs.utils.metadata_cache import metadata_cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def is_valid_resourceid(value):
+    try:
+        UUID(value)
+        return True
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+
+def get_default_language_direction():
+    language_code = settings.LANGUAGE_CODE
+    return metadata_cache.get(
+        ("language_direction", language_code),
+        lambda: models.Language.objects.get(code=language_code).default_direction,
+    )
+
+
+def populate_reference_data(
+    data,
+    simpleid_node,
+    resid_node,
+    resourceidval,
+    next_prn,
+    language_direction=None,
+):
+    """
+    Fills in a missing or invalid PRN and ResourceID in the data of a System
+    Reference tile, calling next_prn() for a new PRN. Batch callers can pass
+    language_direction to avoid looking it up for every tile. Returns True if
+    the data was changed.
+    """
+    changes_made = False
+    language_code = settings.LANGUAGE_CODE
+
+    if not is_valid_prn(data.get(simpleid_node, 0)):
+        try:
+            data[simpleid_node] = next_prn()
+        except Exception as ex:
+            logger.error(f"Could not populate simple id: {ex}")
+            raise
+        changes_made = True
+
+    resid_node_data = data.get(resid_node) or {}
+    resid_node_value = (resid_node_data.get(language_code) or {}).get("value")
+    if not resid_node_value or not is_valid_resourceid(resid_node_value):
+        data[resid_node] = {
+            language_code: {
+                "value": str(resourceidval),
+                "direction": language_direction or get_default_language_direction(),
+            }
+        }
+        changes_made = True
+
+    return changes_made
+
+
+# Matches the hyphenated UUID strings written to the ResourceID node. Anything
+# else is left for is_valid_resourceid() to judge.
+UUID_PATTERN = "^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+
+
+def get_reference_tile_state(
+    ref_nodegroup, simpleid_node, resid_node, resourceinstanceid
+):
+    """
+    Returns (tile count, complete) for the System Reference tiles of a resource
+    in one lightweight query, without loading Tile objects. complete is True
+    only when there is at least one tile and every tile holds a numeric PRN and
+    a UUID ResourceID. Values the SQL checks reject are re-checked in Python by
+    populate_reference_data(), so a False here is never wrong, only cautious.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT count(*), coalesce(bool_and(coalesce(
+                (tiledata ->> %s::text) ~ %s
+                AND tiledata -> %s::text <> '0'::jsonb
+                AND (tiledata -> %s::text -> %s::text ->> 'value') ~* %s,
+                false
+            )), false)
+            FROM tiles
+            WHERE nodegroupid = %s::uuid AND resourceinstanceid = %s::uuid;
+            """,
+            [
+                simpleid_node,
+                PRN_PATTERN,
+                simpleid_node,
+                resid_node,
+                settings.LANGUAGE_CODE,
+                UUID_PATTERN,
+                ref_nodegroup,
+                str(resourceinstanceid),
+            ],
+        )
+        return cursor.fetchone()
+
+
+def get_blank_reference_data(nodegroup_ids):
+    """
+    Returns {nodegroupid: blank tile data} for the given nodegroups. Callers
+    must copy the blank data before filling it in.
+    """
+
+    def load(nodegroup_id):
+        return {
+            str(nodeid): None
+            for nodeid in models.Node.objects.filter(nodegroup_id=nodegroup_id)
+            .exclude(datatype="semantic")
+            .values_list("nodeid", flat=True)
+        }
+
+    return {
+        str(nodegroup_id): metadata_cache.get(
+            ("blank_data", str(nodegroup_id)), lambda: load(nodegroup_id)
+        )
+        for nodegroup_id in nodegroup_ids
+    }
+
+
+def get_blank_reference_tile(nodegroup_id, resourceinstanceid):
+    """
+    Equivalent to Tile.get_blank_tile_from_nodegroup_id() without querying the
+    nodegroup's nodes on every call.
+    """
+    tile = Tile()
+    tile.nodegroup_id = nodegroup_id
+    tile.resourceinstance_id = resourceinstanceid
+    tile.parenttile = None
+    tile.data = dict(get_blank_reference_data([nodegroup_id])[str(nodegroup_id)])
+    return tile
+
+
+def assign_references(tiles):
+    """
+    Completes the PRN and ResourceID of a list of System Reference tiles (Tile
+    or TileModel instances, of any configured graph) in memory. Every missing
+    PRN is allocated in a single query. Saving the tiles is left to the caller.
+
+    Returns the tiles that were changed.
+    """
+    configs = {
+        str(config["uniqueresource_nodegroup"]): config
+        for config in get_function_configs_by_graph().values()
+    }
+    pending = [
+        (tile, configs[str(tile.nodegroup_id)])
+        for tile in tiles
+        if str(tile.nodegroup_id) in configs
+    ]
+    if not pending:
+        return []
+
+    required = Counter(
+        get_sequence_name(config)
+        for tile, config in pending
+        if not is_valid_prn((tile.data or {}).get(config["simpleuid_node"], 0))
+    )
+    prns = {
+        sequence_name: iter(allocate_prns(count, sequence_name))
+        for sequence_name, count in required.items()
+    }
+    language_direction = get_default_language_direction()
+
+    changed = []
+    for tile, config in pending:
+        sequence_name = get_sequence_name(config)
+        if tile.data is None:
+            tile.data = {}
+        if populate_reference_data(
+            tile.data,
+            config["simpleuid_node"],
+            config["resourceid_node"],
+            tile.resourceinstance_id,
+            lambda: next(prns[sequence_name]),
+            language_direction=language_direction,
+        ):
+            changed.append(tile)
+    return changed
+
+
+def assign_resource_references(resources):
+    """
+    Gives each of a list of unsaved Resource objects complete references before
+    they are saved, e.g. with Resource.bulk_save(). A blank System Reference
+    tile is added to any resource without one, then every reference tile is
+    completed with assign_references(), so the whole list costs one PRN query.
+
+    Returns the reference tiles that were added or changed.
+    """
+    configs = get_function_configs_by_graph()
+    ref_tiles = []
+    for resource in resources:
+        config = configs.get(str(resource.graph_id))
+        if config is None:
+            continue
+        ref_nodegroup = str(config["uniqueresource_nodegroup"])
+        existing = [
+            tile for tile in resource.tiles if str(tile.nodegroup_id) == ref_nodegroup
+        ]
+        if not existing:
+            tile = get_blank_reference_tile(ref_nodegroup, resource.resourceinstanceid)
+            resource.tiles.append(tile)
+            existing = [tile]
+        ref_tiles.extend(existing)
+    return assign_references(ref_tiles)
+
+
+def populate_import_references(resources):
+    """
+    Completes the System Reference tiles of a batch of resources in Arches JSON
+    business data format ahead of import, adding a tile to any resource that
+    has none. Every missing PRN in the batch is allocated in a single query per
+    sequence.
+
+    Returns the number of PRNs allocated.
+    """
+    configs = get_function_configs_by_graph()
+    pending = []
+    missing = []
+
+    for resource in resources:
+        resourceinstance = resource["resourceinstance"]
+        config = configs.get(str(resourceinstance["graph_id"]))
+        if config is None:
+            continue
+        ref_nodegroup = config["uniqueresource_nodegroup"]
+        ref_tiles = [
+            t for t in resource["tiles"] if str(t["nodegroup_id"]) == ref_nodegroup
+        ]
+        if not ref_tiles:
+            ref_tile = {
+                "tileid": str(uuid4()),
+                "resourceinstance_id": str(resourceinstance["resourceinstanceid"]),
+                "nodegroup_id": ref_nodegroup,
+                "parenttile_id": None,
+                "sortorder": 0,
+                "provisionaledits": None,
+                "data": {},
+            }
+            resource["tiles"].append(ref_tile)
+            missing.append(ref_tile)
+            ref_tiles = [ref_tile]
+        for ref_tile in ref_tiles:
+            pending.append((ref_tile, config, resourceinstance["resourceinstanceid"]))
+
+    if missing:
+        blank_data = get_blank_reference_data(
+            {tile["nodegroup_id"] for tile in missing}
+        )
+        for tile in missing:
+            tile["data"] = dict(blank_data[tile["nodegroup_id"]])
+
+    required = Counter(
+        get_sequence_name(config)
+        for tile, config, _ in pending
+        if not is_valid_prn(tile["data"].get(config["simpleuid_node"], 0))
+    )
+    prns = {
+        sequence_name: iter(allocate_prns(count, sequence_name))
+        for sequence_name, count in required.items()
+    }
+    language_direction = get_default_language_direction() if pending else None
+
+    for tile, config, resourceinstanceid in pending:
+        sequence_name = get_sequence_name(config)
+        populate_reference_data(
+            tile["data"],
+            config["simpleuid_node"],
+            config["resourceid_node"],
+            resourceinstanceid,
+            lambda: next(prns[sequence_name]),
+            language_direction=language_direction,
+        )
+
+    return sum(required.values())
+
+
+def get_edit_log(
+    graph_id,
+    tile,
+    edit_type,
+    old_value,
+    new_value,
+    user=None,
+    note=None,
+    transaction_id=None,
+):
+    """
+    Returns an unsaved edit log entry for a System Reference tile written
+    without Tile.save(), with the same fields Tile.save_edit() would record.
+    """
+    edit = models.EditLog(
+        resourceclassid=str(graph_id),
+        resourceinstanceid=str(tile.resourceinstance_id),
+        nodegroupid=str(tile.nodegroup_id),
+        tileinstanceid=str(tile.tileid),
+        edittype=edit_type,
+        oldvalue=old_value,
+        newvalue=new_value,
+        timestamp=datetime.datetime.now(),
+        userid=getattr(user, "id", ""),
+        user_email=getattr(user, "email", ""),
+        user_firstname=getattr(user, "first_name", ""),
+        user_lastname=getattr(user, "last_name", ""),
+        user_username=getattr(user, "username", ""),
+        note=note,
+    )
+    if transaction_id is not None:
+        edit.transactionid = transaction_id
+    return edit
+
+
+def write_reference_tile(tile, graph_id, config, old_value=None, user=None):
+    """
+    Persists a System Reference tile that the function created or repaired as a
+    side effect of saving another tile, with one INSERT or UPDATE, an edit log
+    entry and its sysref registry row. Unlike Tile.save() this does not
+    dispatch functions or reindex the resource: the tile save that triggered
+    the function reindexes it once the reference tile is already in the
+    database.
+
+    Pass the tile's previous data as old_value when updating an existing tile;
+    a tile without old_value is inserted.
+    """
+    if old_value is None:
+        Tile.objects.bulk_create([tile])
+        edit_type, old_value = "tile create", {}
+    else:
+        models.TileModel.objects.filter(pk=tile.tileid).update(data=tile.data)
+        edit_type = "tile edit"
+    get_edit_log(graph_id, tile, edit_type, old_value, tile.data, user=user).save()
+    register_references([get_registry_entry(tile, config, graph_id)])
+
+
+def repair_reference_tiles(
+    graph_id, config, resourceinstanceids, dry_run=False, transaction_id=None
+):
+    """
+    Creates or repairs the System Reference tiles of a set of resources without
+    going through Tile.save(). Every missing PRN in the set is allocated in a
+    single query, tiles are written with bulk_create/bulk_update and an edit log
+    entry and sysref registry row are recorded for each tile written. The
+    resources are not reindexed.
+
+    Returns a (created, repaired) tuple of tile counts. When dry_run is True the
+    counts are worked out without allocating PRNs or writing anything.
+    """
+    ref_nodegroup = str(config["uniqueresource_nodegroup"])
+    simpleid_node = config["simpleuid_node"]
+    resid_node = config["resourceid_node"]
+
+    existing_tiles = list(
+        models.TileModel.objects.filter(
+            nodegroup_id=ref_nodegroup, resourceinstance_id__in=resourceinstanceids
+        )
+    )
+    referenced = {str(tile.resourceinstance_id) for tile in existing_tiles}
+    missing = [rid for rid in resourceinstanceids if str(rid) not in referenced]
+
+    new_tiles = []
+    if missing:
+        blank_data = get_blank_reference_data([ref_nodegroup])[ref_nodegroup]
+        new_tiles = [
+            models.TileModel(
+                resourceinstance_id=rid,
+                nodegroup_id=ref_nodegroup,
+                data=dict(blank_data),
+                sortorder=0,
+            )
+            for rid in missing
+        ]
+
+    required = sum(
+        1
+        for tile in existing_tiles + new_tiles
+        if not is_valid_prn((tile.data or {}).get(simpleid_node, 0))
+    )
+    if dry_run:
+        prns = iter([0] * required)
+    else:
+        prns = iter(allocate_prns(required, get_sequence_name(config)))
+    language_direction = get_default_language_direction()
+
+    def populate(data, resourceinstanceid):
+        return populate_reference_data(
+            data,
+            simpleid_node,
+            resid_node,
+            resourceinstanceid,
+            lambda: next(prns),
+            language_direction=language_direction,
+        )
+
+    repaired = []
+    for tile in existing_tiles:
+        data = dict(tile.data or {})
+        if populate(data, tile.resourceinstance_id):
+            repaired.append((tile, tile.data, data))
+    for tile in new_tiles:
+        populate(tile.data, tile.resourceinstance_id)
+
+    if dry_run:
+        return len(new_tiles), len(repaired)
+
+    edits = [
+        get_edit_log(
+            graph_id,
+            tile,
+            "tile create",
+            {},
+            tile.data,
+            note="system reference backfill",
+            transaction_id=transaction_id,
+        )
+        for tile in new_tiles
+    ]
+    for tile, old_data, new_data in repaired:
+        tile.data = new_data
+        edits.append(
+            get_edit_log(
+                graph_id,
+                tile,
+                "tile edit",
+                old_data,
+                new_data,
+                note="system reference backfill",
+                transaction_id=transaction_id,
+            )
+        )
+
+    with transaction.atomic():
+        models.TileModel.objects.bulk_create(new_tiles)
+        models.TileModel.objects.bulk_update(
+            [tile for tile, _, _ in repaired], ["data"]
+        )
+        models.EditLog.objects.bulk_create(edits)
+        register_references(
+            get_registry_entry(tile, config, graph_id)
+            for tile in new_tiles + [tile for tile, _, _ in repaired]
+        )
+
+    return len(new_tiles), len(repaired)
@@ -0,0 +1,124 @@
+import re
+
+from django.utils.translation import gettext as _
+
+from arches.app.search.components.base import BaseSearchFilter
+from arches.app.search.elasticsearch_dsl_builder import (
+    Bool,
+    Match,
+    Nested,
+    Range,
+    Terms,
+)
+from arches.app.utils.betterJSONSerializer import JSONDeserializer
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+
+details = {
+    "searchcomponentid": "012c999c-79e3-4c91-aee0-c608024b49a2",
+    "name": "Primary Reference Number Filter",
+    "icon": "fa fa-hashtag",
+    "modulename": "prn_filter.py",
+    "classname": "PrnFilter",
+    "type": "prn-filter-type",
+    "componentpath": "views/components/search/prn-filter",
+    "componentname": "prn-filter",
+    "config": {},
+}
+
+PRN_VALUE_PATTERN = re.compile(r"^[0-9]{1,18}$")
+PRN_RANGE_PATTERN = re.compile(r"^([0-9]{1,18})-([0-9]{1,18})$")
+
+# Arches indexes numbers as doubles, which hold integers exactly only up to 2^53
+MAX_SEARCHABLE_PRN = 2**53
+
+
+def parse_prn_query(text):
+    """
+    Parses a list of PRNs and PRN ranges separated by commas or spaces, e.g.
+    "1001, 1005 2000-2100", into ([1001, 1005], [(2000, 2100)]). Raises
+    ValueError for anything else, and for PRNs above MAX_SEARCHABLE_PRN, which
+    the numbers Arches indexes cannot match exactly.
+    """
+    values = []
+    ranges = []
+    for token in re.split(r"[\s,;]+", re.sub(r"\s*-\s*", "-", text.strip())):
+        if not token:
+            continue
+        if PRN_VALUE_PATTERN.match(token):
+            values.append(int(token))
+            continue
+        match = PRN_RANGE_PATTERN.match(token)
+        if match is None:
+            raise ValueError(
+                _("{token} is not a Primary Reference Number or range").format(
+                    token=token
+                )
+            )
+        low, high = sorted(int(bound) for bound in match.groups())
+        ranges.append((low, high))
+
+    too_large = [
+        value
+        for value in values + [high for _, high in ranges]
+        if value > MAX_SEARCHABLE_PRN
+    ]
+    if too_large:
+        raise ValueError(
+            _(
+                "{prn} is too large to search for: Primary Reference Numbers above "
+                "{limit} cannot be matched exactly"
+            ).format(prn=too_large[0], limit=MAX_SEARCHABLE_PRN)
+        )
+    return values, ranges
+
+
+class PrnFilter(BaseSearchFilter):
+    """
+    Filters resources by Primary Reference Number: single values, lists and
+    ranges. The filter compiles to a terms or range query on the numbers
+    Arches indexes for each resource, limited to the System Reference
+    nodegroups, rather than a text match on the PRN.
+    """
+
+    def append_dsl(self, search_query_object, **kwargs):
+        permitted_nodegroups = kwargs.get("permitted_nodegroups")
+        include_provisional = kwargs.get("include_provisional")
+        querystring = JSONDeserializer().deserialize(kwargs.get("querystring", "{}"))
+        values, ranges = parse_prn_query(str(querystring.get("query", "")))
+        if not values and not ranges:
+            return
+
+        nodegroups = {
+            config["uniqueresource_nodegroup"]
+            for config in get_function_configs_by_graph().values()
+        }
+        if permitted_nodegroups is not None:
+            nodegroups &= {str(nodegroup) for nodegroup in permitted_nodegroups}
+
+        prn_query = Bool()
+        if values:
+            prn_query.should(Terms(field="numbers.number", terms=values))
+        for low, high in ranges:
+            prn_query.should(Range(field="numbers.number", gte=low, lte=high))
+
+        number_filter = Bool()
+        number_filter.must(prn_query)
+        number_filter.filter(
+            Terms(field="numbers.nodegroup_id", terms=sorted(nodegroups))
+        )
+        if include_provisional is False:
+            number_filter.must_not(
+                Match(field="numbers.provisional", query="true", type="phrase")
+            )
+        elif include_provisional == "only provisional":
+            number_filter.must_not(
+                Match(field="numbers.provisional", query="false", type="phrase")
+            )
+
+        nested = Nested(path="numbers", query=number_filter)
+        search_query = Bool()
+        if querystring.get("inverted", False):
+            search_query.must_not(nested)
+        else:
+            search_query.filter(nested)
+        search_query_object["query"].add_query(search_query)
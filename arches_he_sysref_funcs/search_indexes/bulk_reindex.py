@@ -0,0 +1,158 @@
+"""
+Rebuilds custom Elasticsearch indexes a chunk of resources at a time, across a
+pool of worker processes.
+"""
+
+import multiprocessing
+import time
+from collections import deque
+
+from arches.app.models import models
+from arches.app.models.system_settings import settings
+from arches.app.utils import import_class_from_string
+from django.db import connection, connections
+from elasticsearch import helpers
+
+
+def get_index_graphids(index, graphids=None):
+    """
+    Returns the graphs whose resources the index holds: those its
+    get_graphids_to_index() returns, if it has one, or else every resource
+    graph. When graphids is given only those of them are returned.
+    """
+    get_graphids = getattr(index, "get_graphids_to_index", None)
+    if get_graphids is not None:
+        index_graphids = [str(graphid) for graphid in get_graphids()]
+    else:
+        index_graphids = [
+            str(graphid)
+            for graphid in models.GraphModel.objects.filter(isresource=True)
+            .exclude(graphid=settings.SYSTEM_SETTINGS_RESOURCE_MODEL_ID)
+            .values_list("graphid", flat=True)
+        ]
+    if graphids is None:
+        return index_graphids
+    graphids = {str(graphid) for graphid in graphids}
+    return [graphid for graphid in index_graphids if graphid in graphids]
+
+
+def get_resource_chunks(graphids, chunk_size):
+    """
+    Yields lists of (resourceinstanceid, graphid) of the resources of the given
+    graphs, chunk_size at a time, from a server-side cursor.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT resourceinstanceid::text, graphid::text
+            FROM resource_instances
+            WHERE graphid = ANY(%s::uuid[])
+            ORDER BY resourceinstanceid;
+            """,
+            [graphids],
+        )
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def index_chunk(args, index=None):
+    """
+    Indexes a chunk of (resourceinstanceid, graphid) pairs with one tile query
+    and one bulk request, and returns the number of documents indexed and
+    failed. Runs in a pool worker, which builds its own index, when index is
+    not given. Only the tiles of the nodegroups the index's
+    get_nodegroups_to_index() returns are loaded, if it has one.
+    """
+    index_class, index_name, chunk = args
+    if index is None:
+        index = import_class_from_string(index_class)(index_name)
+
+    tiles = models.TileModel.objects.filter(
+        resourceinstance_id__in=[resourceinstanceid for resourceinstanceid, _ in chunk]
+    )
+    get_nodegroups = getattr(index, "get_nodegroups_to_index", None)
+    if get_nodegroups is not None:
+        tiles = tiles.filter(nodegroup_id__in=list(get_nodegroups()))
+    tiles_by_resource = {}
+    for tile in tiles:
+        tiles_by_resource.setdefault(str(tile.resourceinstance_id), []).append(tile)
+
+    items = []
+    for resourceinstanceid, graphid in chunk:
+        document, doc_id = index.get_documents_to_index(
+            models.ResourceInstance(
+                resourceinstanceid=resourceinstanceid, graph_id=graphid
+            ),
+            tiles_by_resource.get(resourceinstanceid, []),
+        )
+        if document is not None and doc_id is not None:
+            items.append(
+                index.se.create_bulk_item(
+                    index=index.index_name, id=doc_id, data=document
+                )
+            )
+    if not items:
+        return 0, 0
+    return helpers.bulk(index.se.es, items, raise_on_error=False, stats_only=True)
+
+
+def reindex(
+    index,
+    graphids=None,
+    clear_index=True,
+    chunk_size=settings.BULK_IMPORT_BATCH_SIZE,
+    processes=1,
+    progress=None,
+):
+    """
+    Rebuilds a custom index from the resources of the given graphs (default
+    every graph the index holds). Resource ids are streamed from a server-side
+    cursor chunk_size at a time, and each chunk's tiles are loaded in one query
+    and sent in one bulk request, across processes worker processes. After
+    each chunk, progress(indexed, failed, elapsed) is called if given. Returns
+    (indexed, failed, elapsed) once the index has been refreshed.
+    """
+    graphids = get_index_graphids(index, graphids)
+    if clear_index:
+        index.delete_index()
+        index.prepare_index()
+
+    index_class = f"{type(index).__module__}.{type(index).__qualname__}"
+    totals = {"indexed": 0, "failed": 0}
+    start = time.perf_counter()
+
+    def record(result):
+        indexed, failed = result
+        totals["indexed"] += indexed
+        totals["failed"] += failed
+        if progress is not None:
+            progress(totals["indexed"], totals["failed"], time.perf_counter() - start)
+
+    chunks = get_resource_chunks(graphids, max(chunk_size, 1))
+    if processes > 1:
+        # Workers are forked before the cursor is opened, and open their own
+        # database connections. A few chunks are queued per worker so that
+        # memory stays flat however many resources there are.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(processes=processes) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(
+                    pool.apply_async(
+                        index_chunk, ((index_class, index.index_name, chunk),)
+                    )
+                )
+                if len(pending) >= processes * 2:
+                    record(pending.popleft().get())
+            while pending:
+                record(pending.popleft().get())
+    else:
+        for chunk in chunks:
+            record(index_chunk((index_class, index.index_name, chunk), index))
+
+    index.se.refresh(index=index.index_name)
+    return totals["indexed"], totals["failed"], time.perf_counter() - start
@@ -0,0 +1,107 @@
+import logging
+
+from arches.app.models.system_settings import settings
+from arches.app.search.base_index import BaseIndex
+
+from arches_he_sysref_funcs.references.allocation import (
+    get_sequence_name,
+    is_valid_prn,
+)
+from arches_he_sysref_funcs.references.config import get_function_configs_by_graph
+from arches_he_sysref_funcs.search_indexes import bulk_reindex
+
+logger = logging.getLogger(__name__)
+
+
+class SystemReferenceIndex(BaseIndex):
+    """
+    Indexes the Primary Reference Number of each resource of a graph with the
+    Generate Unique References function as a long, and its ResourceID as a
+    keyword, so that exact and range PRN searches are term and range queries
+    rather than text matches on the resource index. Register it in
+    ELASTICSEARCH_CUSTOM_INDEXES.
+    """
+
+    def prepare_index(self):
+        self.index_metadata = {
+            "mappings": {
+                "properties": {
+                    "prn": {"type": "long"},
+                    "resourceid": {"type": "keyword"},
+                    "resourceinstanceid": {"type": "keyword"},
+                    "graphid": {"type": "keyword"},
+                    "sequence_name": {"type": "keyword"},
+                }
+            }
+        }
+        super(SystemReferenceIndex, self).prepare_index()
+
+    def get_documents_to_index(self, resourceinstance, tiles):
+        """
+        Reads the PRN and ResourceID from the resource's System Reference tile.
+        Returns (None, None) for resources of graphs without the function.
+        """
+        config = get_function_configs_by_graph().get(str(resourceinstance.graph_id))
+        if config is None:
+            return None, None
+
+        document = {
+            "prn": None,
+            "resourceid": None,
+            "resourceinstanceid": str(resourceinstance.resourceinstanceid),
+            "graphid": str(resourceinstance.graph_id),
+            "sequence_name": get_sequence_name(config),
+        }
+        for tile in tiles:
+            if str(tile.nodegroup_id) != config["uniqueresource_nodegroup"]:
+                continue
+            data = tile.data or {}
+            prn = data.get(config["simpleuid_node"])
+            if is_valid_prn(prn) and len(str(prn)) <= 18:
+                document["prn"] = int(prn)
+            resourceid = data.get(config["resourceid_node"]) or {}
+            document["resourceid"] = (resourceid.get(settings.LANGUAGE_CODE) or {}).get(
+                "value"
+            )
+            break
+
+        return document, document["resourceinstanceid"]
+
+    def get_graphids_to_index(self):
+        return list(get_function_configs_by_graph())
+
+    def get_nodegroups_to_index(self):
+        return [
+            config["uniqueresource_nodegroup"]
+            for config in get_function_configs_by_graph().values()
+        ]
+
+    def reindex(
+        self,
+        graphids=None,
+        clear_index=True,
+        batch_size=settings.BULK_IMPORT_BATCH_SIZE,
+        quiet=False,
+        processes=1,
+    ):
+        """
+        Rebuilds the index for the given graphs (default every graph with the
+        function), batch_size resources at a time across processes worker
+        processes; see bulk_reindex.reindex(). Only the System Reference tiles
+        are loaded. Returns the number of documents indexed.
+        """
+        indexed, failed, elapsed = bulk_reindex.reindex(
+            self,
+            graphids=graphids,
+            clear_index=clear_index,
+            chunk_size=batch_size,
+            processes=processes,
+        )
+        if failed:
+            logger.warning(f"Failed to index {failed} resources into {self.index_name}")
+        if not quiet:
+            logger.info(
+                f"Indexed {indexed} resources into {self.index_name} in {elapsed:.1f}s "
+                f"({indexed / elapsed if elapsed else 0:.0f} docs/sec)"
+            )
+        return indexed
@@ -20,6 +20,66 @@ APP_ROOT = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe(
 # Optional initial seed for primary reference numbers
 # PRIMARY_REFERENCE_NUMBER_INITIAL_SEED = 1000
 
+# Optional number of primary reference numbers each worker process reserves from
+# the database sequence at a time. Values above 1 reduce sequence round trips
+# during bulk edits at the cost of gaps in the numbering.
+# PRIMARY_REFERENCE_NUMBER_BLOCK_SIZE = 100
+
+# Give each graph without a sequence_name in its function config a sequence of its
+# own (named after its System Reference nodegroup) instead of the shared
+# simpleid_nextval_id_seq. PRNs are then only unique within each graph.
+# PRIMARY_REFERENCE_NUMBER_SEQUENCE_PER_GRAPH = False
+
+# How primary reference numbers are allocated: "sequence" (a PostgreSQL sequence, the
+# default), "counter_table" (sharded counter rows claimed with FOR UPDATE SKIP LOCKED,
+# SYSREF_PRN_COUNTER_SHARDS rows per sequence), "memory" (per process, for unit tests
+# and benchmarks only) or the dotted path of a PrimaryReferenceNumberAllocator.
+# SYSREF_PRN_ALLOCATOR = "sequence"
+# SYSREF_PRN_COUNTER_SHARDS = 4
+
+# Largest number of primary reference numbers reserved per query when System
+# Reference tiles are completed during a business data import (defaults to 1000).
+# Arches completes them while validating the file, even when it is not imported
+# afterwards. Each process reserves 1, then 2, 4, ... numbers up to this size, and
+# the numbers it has not used when it exits are skipped: at most as many as it
+# used, and never more than this size.
+# PRIMARY_REFERENCE_NUMBER_IMPORT_BATCH_SIZE = 1000
+
+# Seconds each worker caches the function configs, nodegroup and language metadata
+# read on every save (defaults to 300). Changes made in the same process clear the
+# cache immediately; None caches until the next change.
+# SYSREF_METADATA_CACHE_TIMEOUT = 300
+
+# Write System Reference tiles created or repaired as a side effect of saving another
+# tile directly (with an edit log entry) instead of through a nested Tile.save(). The
+# nested save runs functions and reindexes the resource a second time.
+# SYSREF_DIRECT_TILE_WRITES = False
+
+# Record the duration and query count of each phase of the Generate Unique References
+# function (the save, the reference tile check, PRN allocation, nextval, sequence
+# bootstrap and seeding scan, and reference tile writes): "logging", "memory",
+# "statsd" or the dotted path of a TimingSink. Off by default.
+# SYSREF_TIMING_SINK = "statsd"
+# SYSREF_STATSD_HOST = "localhost"
+# SYSREF_STATSD_PORT = 8125
+# SYSREF_STATSD_PREFIX = "sysref"
+
+# Profile GenerateUniqueReferences.save() with cProfile and write the profiles, named
+# after the resource and nodegroup saved, to this directory. Profile a fraction of calls
+# (defaults to 1.0, every call) and keep only profiles of calls that took at least the
+# threshold (defaults to 0). Off unless SYSREF_PROFILE_DIR is set.
+# SYSREF_PROFILE_DIR = "/tmp/sysref_profiles"
+# SYSREF_PROFILE_SAMPLE_RATE = 0.01
+# SYSREF_PROFILE_THRESHOLD_MS = 500
+
+# Caching of PRNs resolved through /sysref/resolve/<prn>: the number of PRNs each
+# worker keeps in its LRU cache (defaults to 10000, 0 disables it), an optional
+# Django cache alias shared by all workers, and how long resolved PRNs are cached
+# and may be cached by clients, in seconds (defaults to 300).
+# SYSREF_RESOLVE_CACHE_SIZE = 10000
+# SYSREF_RESOLVE_CACHE_ALIAS = "default"
+# SYSREF_RESOLVE_CACHE_TIMEOUT = 300
+
 WEBPACK_LOADER = {
     "DEFAULT": {
         "STATS_FILE": os.path.join(APP_ROOT, "..", "webpack/webpack-stats.json"),
@@ -86,7 +146,13 @@ ELASTICSEARCH_CONNECTION_OPTIONS = {
 # a prefix to append to all elasticsearch indexes, note: must be lower case
 ELASTICSEARCH_PREFIX = "arches_he_sysref_funcs"
 
-ELASTICSEARCH_CUSTOM_INDEXES = []
+ELASTICSEARCH_CUSTOM_INDEXES = [
+    {
+        "module": "arches_he_sysref_funcs.search_indexes.system_reference_index.SystemReferenceIndex",
+        "name": "system_references",
+        "should_update_asynchronously": False,
+    }
+]
 # [{
 #     'module': 'arches_he_sysref_funcs.search_indexes.sample_index.SampleIndex',
 #     'name': 'my_new_custom_index', <-- follow ES index naming rules
@@ -0,0 +1,20 @@
+import logging
+
+from celery import shared_task
+
+from arches_he_sysref_funcs.references.allocation import create_prn_indexes
+
+
+@shared_task
+def build_prn_indexes():
+    """
+    Builds the Primary Reference Number indexes of the configured graphs
+    concurrently, as the sysref_indexes command does.
+    """
+    logger = logging.getLogger(__name__)
+    built, dropped = create_prn_indexes(concurrently=True)
+    for name in built:
+        logger.info(f"Built {name}")
+    for name in dropped:
+        logger.info(f"Dropped {name}")
+    return built, dropped
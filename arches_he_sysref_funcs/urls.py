@@ -3,8 +3,12 @@ from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from django.urls import include, path
 
+from arches_he_sysref_funcs.views.sysref import BulkResolvePrnView, ResolvePrnView
+
 urlpatterns = [
     # project-level urls
+    path("sysref/resolve/<int:prn>", ResolvePrnView.as_view(), name="sysref_resolve"),
+    path("sysref/resolve", BulkResolvePrnView.as_view(), name="sysref_bulk_resolve"),
 ]
 
 # Ensure Arches core urls are superseded by project-level urls
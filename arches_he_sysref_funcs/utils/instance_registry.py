@@ -0,0 +1,32 @@
+import threading
+
+
+class InstanceRegistry:
+    """
+    Thread-safe, process-local map of objects built on first use, e.g. the
+    allocator, timing sink or resolve cache named by a setting. Unlike the
+    metadata cache it is never cleared by signals, so the state these objects
+    hold lasts for the life of the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instances = {}
+
+    def get(self, key, factory):
+        """
+        Returns the object registered under key, calling factory() to build
+        and register it if there is none yet. Concurrent callers for the same
+        key get the same object.
+        """
+        instance = self._instances.get(key)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(key)
+                if instance is None:
+                    instance = self._instances[key] = factory()
+        return instance
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
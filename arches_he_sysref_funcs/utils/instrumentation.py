@@ -0,0 +1,178 @@
+import functools
+import logging
+import socket
+import threading
+import time
+from contextlib import nullcontext
+
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from arches_he_sysref_funcs.utils.instance_registry import InstanceRegistry
+from arches_he_sysref_funcs.utils.metadata_cache import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+class TimingSink:
+    """
+    Receives the duration and query count of each timed phase of the Generate
+    Unique References function. The sink is chosen with the SYSREF_TIMING_SINK
+    setting; see get_timing_sink().
+    """
+
+    def record(self, phase, duration, queries):
+        raise NotImplementedError
+
+
+class LoggingSink(TimingSink):
+    def record(self, phase, duration, queries):
+        logger.info(f"{phase}: {duration * 1000:.3f} ms, {queries} queries")
+
+
+class InMemorySink(TimingSink):
+    """
+    Aggregates phase timings in memory, e.g. for tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def record(self, phase, duration, queries):
+        with self._lock:
+            stats = self._phases.setdefault(
+                phase, {"count": 0, "total": 0.0, "max": 0.0, "queries": 0}
+            )
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            stats["queries"] += queries
+
+    def summary(self):
+        """
+        Returns {phase: {count, total_ms, mean_ms, max_ms, queries}}.
+        """
+        with self._lock:
+            return {
+                phase: {
+                    "count": stats["count"],
+                    "total_ms": stats["total"] * 1000,
+                    "mean_ms": stats["total"] / stats["count"] * 1000,
+                    "max_ms": stats["max"] * 1000,
+                    "queries": stats["queries"],
+                }
+                for phase, stats in self._phases.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._phases.clear()
+
+
+class StatsdSink(TimingSink):
+    """
+    Sends each phase to a StatsD server over UDP as a timer and a query
+    counter, at SYSREF_STATSD_HOST:SYSREF_STATSD_PORT (default localhost:8125)
+    under SYSREF_STATSD_PREFIX (default "sysref"). Send failures are ignored
+    so that metrics can never fail a save.
+    """
+
+    def __init__(self, host=None, port=None, prefix=None):
+        self.address = (
+            host or get_setting("SYSREF_STATSD_HOST", "localhost"),
+            int(port or get_setting("SYSREF_STATSD_PORT", 8125)),
+        )
+        self.prefix = prefix or get_setting("SYSREF_STATSD_PREFIX", "sysref")
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, phase, duration, queries):
+        metric = f"{self.prefix}.{phase}"
+        payload = (
+            f"{metric}.time:{duration * 1000:.3f}|ms\n{metric}.queries:{queries}|c"
+        )
+        try:
+            self.socket.sendto(payload.encode(), self.address)
+        except OSError:
+            pass
+
+
+TIMING_SINKS = {
+    "logging": LoggingSink,
+    "memory": InMemorySink,
+    "statsd": StatsdSink,
+}
+
+_sinks = InstanceRegistry()
+
+
+def get_timing_sink():
+    """
+    Returns the sink named by the SYSREF_TIMING_SINK setting: "logging",
+    "memory", "statsd" or the dotted path of a TimingSink subclass. Returns
+    None, disabling timing, when the setting is not set.
+    """
+    name = get_setting("SYSREF_TIMING_SINK", None)
+    if not name:
+        return None
+    return _sinks.get(name, lambda: (TIMING_SINKS.get(name) or import_string(name))())
+
+
+class Phase:
+    """
+    Times a block and counts the queries run on the default connection
+    inside it. Nested phases each count every query run within them.
+    """
+
+    __slots__ = ("sink", "name", "queries", "start", "wrapper")
+
+    def __init__(self, sink, name):
+        self.sink = sink
+        self.name = name
+
+    def __enter__(self):
+        self.queries = 0
+        self.wrapper = connection.execute_wrapper(self.count_query)
+        self.wrapper.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        self.wrapper.__exit__(None, None, None)
+        self.sink.record(self.name, duration, self.queries)
+        return False
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+_disabled = nullcontext()
+
+
+def timed(name):
+    """
+    Returns a context manager that records the duration and query count of
+    its block as the named phase, or a shared no-op when timing is disabled.
+    """
+    sink = get_timing_sink()
+    if sink is None:
+        return _disabled
+    return Phase(sink, name)
+
+
+def timed_phase(name):
+    """
+    Decorator form of timed().
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from arches.app.models import models
+from arches.app.models.system_settings import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+_unset = object()
+
+
+class MetadataCache:
+    """
+    Process-level cache for the graph, function config and settings metadata
+    read on every save by the Generate Unique References function.
+
+    Entries are dropped whenever a graph is published, a function config, node
+    or language changes, or a setting is overridden. Those signals only reach
+    the process that made the change, so entries also expire after
+    SYSREF_METADATA_CACHE_TIMEOUT seconds (default 300, None to never expire)
+    to bound how long other workers can serve stale metadata.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._timeout = _unset
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > now):
+            return entry[0]
+
+        value = loader()
+        timeout = self.get_timeout()
+        with self._lock:
+            self._entries[key] = (value, None if timeout is None else now + timeout)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._timeout = _unset
+
+    def get_timeout(self):
+        if self._timeout is _unset:
+            self._timeout = getattr(settings, "SYSREF_METADATA_CACHE_TIMEOUT", 300)
+        return self._timeout
+
+
+metadata_cache = MetadataCache()
+
+
+def get_setting(name, default=None):
+    """
+    Returns a setting, caching the result. Looking up a setting that is not
+    defined in settings.py makes Arches reload system settings from the
+    database, which is too costly to repeat on every save.
+    """
+
+    def load():
+        value = getattr(settings, name, _unset)
+        return default if value is _unset else value
+
+    return metadata_cache.get(("setting", name), load)
+
+
+@receiver(post_save, sender=models.FunctionXGraph)
+@receiver(post_delete, sender=models.FunctionXGraph)
+@receiver(post_save, sender=models.GraphXPublishedGraph)
+@receiver(post_save, sender=models.Node)
+@receiver(post_delete, sender=models.Node)
+@receiver(post_save, sender=models.Language)
+@receiver(post_delete, sender=models.Language)
+def clear_metadata_cache(sender, **kwargs):
+    metadata_cache.clear()
+
+
+@receiver(setting_changed)
+def clear_metadata_cache_on_setting_changed(sender, **kwargs):
+    metadata_cache.clear()
@@ -0,0 +1,84 @@
+import cProfile
+import datetime
+import functools
+import logging
+import os
+import random
+import threading
+import time
+
+from arches_he_sysref_funcs.utils.metadata_cache import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Only one profiler can be active per thread, so calls nested inside a
+# profiled call (e.g. a nested Tile.save()) are left to the outer profile
+_state = threading.local()
+
+
+def should_profile():
+    if not get_setting("SYSREF_PROFILE_DIR", None):
+        return False
+    if getattr(_state, "active", False):
+        return False
+    return random.random() < float(get_setting("SYSREF_PROFILE_SAMPLE_RATE", 1.0))
+
+
+def get_profile_path(directory, ids, duration):
+    timestamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    name = "_".join(str(value) for value in ids)
+    return os.path.join(
+        directory, f"{timestamp}_{name}_{duration * 1000:.0f}ms_{os.getpid()}.prof"
+    )
+
+
+def write_profile(profiler, ids, duration):
+    threshold = float(get_setting("SYSREF_PROFILE_THRESHOLD_MS", 0) or 0)
+    if duration * 1000 < threshold:
+        return None
+    directory = get_setting("SYSREF_PROFILE_DIR", None)
+    path = get_profile_path(directory, ids, duration)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+    except OSError as ex:
+        logger.warning(f"Could not write profile {path}: {ex}")
+        return None
+    return path
+
+
+def profiled(get_ids):
+    """
+    Decorator that runs the decorated function under cProfile when
+    SYSREF_PROFILE_DIR is set, for a SYSREF_PROFILE_SAMPLE_RATE fraction of
+    calls (default 1.0). Profiles of calls that took at least
+    SYSREF_PROFILE_THRESHOLD_MS milliseconds (default 0) are written to the
+    directory, named after the values get_ids(*args, **kwargs) returns. When
+    SYSREF_PROFILE_DIR is not set this costs a cached settings lookup.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not should_profile():
+                return func(*args, **kwargs)
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this thread
+                return func(*args, **kwargs)
+            _state.active = True
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                profiler.disable()
+                _state.active = False
+                write_profile(profiler, get_ids(*args, **kwargs), duration)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,181 @@
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    set_response_etag,
+)
+from django.utils.translation import gettext as _
+from django.views.generic import View
+
+from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches.app.utils.permission_backend import (
+    get_filtered_instances,
+    get_resource_types_by_perm,
+    user_can_read_resource,
+)
+from arches.app.utils.response import JSONErrorResponse, JSONResponse
+from arches_he_sysref_funcs.references.registry import (
+    RESOLVE_BY,
+    get_resolve_cache_timeout,
+    resolve_prn,
+    resolve_reference_groups,
+)
+
+
+class ResolvePrnView(View):
+    """
+    Resolves a Primary Reference Number to its resource from the sysref
+    registry, e.g. for permalinks and citations:
+
+        GET /sysref/resolve/<prn>[?sequence=<sequence name>]
+
+    Responds with the prn, resourceinstanceid, graphid and sequence_name of
+    the resource, or with 300 and a list of matches when graphs drawing from
+    separate sequences share the PRN and no sequence is given. Resources the
+    user cannot read are left out, so a PRN of a resource the user cannot read
+    is a 404 like an unknown one. Responses carry an ETag and are cacheable by
+    the client for SYSREF_RESOLVE_CACHE_TIMEOUT seconds.
+    """
+
+    def get(self, request, prn):
+        entries = [
+            entry
+            for entry in resolve_prn(prn, request.GET.get("sequence") or None)
+            if user_can_read_resource(request.user, entry["resourceinstanceid"])
+        ]
+        if not entries:
+            return JSONErrorResponse(
+                _("Not found"),
+                _("No resource has the Primary Reference Number {prn}").format(prn=prn),
+                status=404,
+            )
+
+        if len(entries) == 1:
+            response = JSONResponse(entries[0])
+        else:
+            response = JSONResponse({"prn": prn, "matches": entries}, status=300)
+
+        timeout = get_resolve_cache_timeout()
+        if timeout is None:
+            patch_cache_control(response, private=True)
+        else:
+            patch_cache_control(response, private=True, max_age=int(timeout))
+        set_response_etag(response)
+        return get_conditional_response(
+            request, etag=response["ETag"], response=response
+        )
+
+
+class BulkResolvePrnView(View):
+    """
+    Resolves many PRNs, or ResourceIDs, in one request for integrations:
+
+        POST /sysref/resolve?by=prn|resourceinstanceid[&sequence=<name>]
+
+    The text/plain body holds one PRN or ResourceID per line and the response
+    streams back one JSON object per line (see resolve_references()), flagging
+    unknown identifiers with "found": false. The body is read and answered a
+    chunk at a time, so lists of any length are resolved in flat memory.
+    Identifiers of resources the user cannot read are reported exactly as
+    unknown ones. The request must carry the CSRF token like any other POST
+    made with the session cookie.
+    """
+
+    chunk_size = 1000
+
+    def post(self, request):
+        # Form bodies are parsed whole by the CSRF check, and rejected over
+        # DATA_UPLOAD_MAX_MEMORY_SIZE, so only plain text is streamed
+        if request.content_type != "text/plain":
+            return JSONErrorResponse(
+                _("Unsupported media type"),
+                _("Identifiers must be sent as text/plain, one per line"),
+                status=415,
+            )
+        by = request.GET.get("by", "prn")
+        if by not in RESOLVE_BY:
+            return JSONErrorResponse(
+                _("Invalid request"),
+                _("Identifiers can only be resolved by {options}").format(
+                    options=" or ".join(RESOLVE_BY)
+                ),
+                status=400,
+            )
+
+        groups = resolve_reference_groups(
+            self.read_values(request),
+            by=by,
+            sequence_name=request.GET.get("sequence") or None,
+            chunk_size=self.chunk_size,
+        )
+        return StreamingHttpResponse(
+            (
+                json.dumps(result) + "\n"
+                for result in self.filter_readable(request.user, groups, by)
+            ),
+            content_type="application/x-ndjson",
+        )
+
+    def read_values(self, request):
+        # Lines are read from the request stream rather than request.body so
+        # that the body is never held in memory whole. A line that is not
+        # valid text or JSON is passed on as is, and reported as not found.
+        for line in request:
+            value = line.decode("utf-8", errors="replace").strip()
+            if value.startswith('"'):
+                try:
+                    decoded = json.loads(value)
+                except ValueError:
+                    decoded = None
+                if isinstance(decoded, str):
+                    value = decoded.strip()
+            if value:
+                yield value
+
+    def filter_readable(self, user, groups, by):
+        """
+        Yields the matches of each (value, entries) group the user can read,
+        or a single {by: value, "found": False} when there are none, checking
+        instance permissions once per chunk of groups.
+        """
+        readable_graphs = (
+            None
+            if user.is_superuser
+            else set(get_resource_types_by_perm(user, ["models.read_nodegroup"]))
+        )
+        se = None if readable_graphs is None else SearchEngineFactory().create()
+        while True:
+            chunk = list(islice(groups, self.chunk_size))
+            if not chunk:
+                break
+            exclusive, instances = False, set()
+            if readable_graphs is not None:
+                resourceids = list(
+                    {
+                        entry["resourceinstanceid"]
+                        for _, entries in chunk
+                        for entry in entries
+                    }
+                )
+                # The instances are those the user may read when the set is
+                # exclusive (default deny), and those kept from them otherwise
+                if resourceids:
+                    exclusive, instances = get_filtered_instances(
+                        user, se, resources=resourceids
+                    )
+                    instances = set(instances)
+            for value, entries in chunk:
+                if readable_graphs is not None:
+                    entries = [
+                        entry
+                        for entry in entries
+                        if entry["graphid"] in readable_graphs
+                        and (entry["resourceinstanceid"] in instances) == exclusive
+                    ]
+                if entries:
+                    yield from entries
+                else:
+                    yield {by: value, "found": False}
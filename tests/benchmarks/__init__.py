@@ -0,0 +1,86 @@
+"""
+Benchmarks for the Generate Unique References function. They run against the
+test database like the other tests, but are skipped unless SYSREF_BENCHMARK is
+set, e.g.:
+
+    SYSREF_BENCHMARK=1 python manage.py test tests.benchmarks --settings="tests.test_settings"
+
+Results are printed as JSON lines, or appended to the file named by
+SYSREF_BENCHMARK_OUTPUT, so that runs can be diffed between releases.
+"""
+
+import json
+import math
+import os
+import platform
+import sys
+from importlib.metadata import PackageNotFoundError, version
+
+from arches_he_sysref_funcs.utils.metadata_cache import get_setting
+
+
+BENCHMARKS_ENABLED = bool(os.environ.get("SYSREF_BENCHMARK"))
+SKIP_REASON = "Set SYSREF_BENCHMARK=1 to run benchmarks"
+
+
+def get_env_list(name, default):
+    return [int(value) for value in os.environ.get(name, default).split(",") if value]
+
+
+def get_package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def get_environment():
+    """
+    Returns the versions and settings a benchmark result depends on.
+    """
+    return {
+        "python": platform.python_version(),
+        "arches": get_package_version("arches"),
+        "arches_he_sysref_funcs": get_package_version("arches_he_sysref_funcs"),
+        "allocator": get_setting("SYSREF_PRN_ALLOCATOR", "sequence"),
+        "block_size": get_setting("PRIMARY_REFERENCE_NUMBER_BLOCK_SIZE", 1),
+        "direct_tile_writes": get_setting("SYSREF_DIRECT_TILE_WRITES", False),
+    }
+
+
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarise(latencies):
+    """
+    Summarises a list of latencies in seconds, reported in milliseconds.
+    """
+    return {
+        "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p95": round(percentile(latencies, 95) * 1000, 3),
+        "p99": round(percentile(latencies, 99) * 1000, 3),
+        "max": round(max(latencies) * 1000, 3),
+    }
+
+
+def write_results(results):
+    """
+    Writes benchmark results as JSON lines with sorted keys, to
+    SYSREF_BENCHMARK_OUTPUT if set, otherwise to stdout.
+    """
+    lines = [json.dumps(result, sort_keys=True) for result in results]
+    output = os.environ.get("SYSREF_BENCHMARK_OUTPUT")
+    if output:
+        with open(output, "a") as f:
+            f.writelines(f"{line}\n" for line in lines)
+    else:
+        sys.stdout.writelines(f"{line}\n" for line in lines)
@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import time
+from collections import Counter
+from unittest import skipUnless
+
+from django.db import connections
+from django.test import TransactionTestCase
+from arches.app.models import models
+from arches.app.models.resource import Resource
+from arches.app.models.tile import Tile
+from tests.benchmarks import (
+    BENCHMARKS_ENABLED,
+    SKIP_REASON,
+    get_env_list,
+    get_environment,
+    summarise,
+    write_results,
+)
+from tests.generate_unique_references.graph_fixtures import (
+    DESCRIPTION_NODE_ID,
+    DESCRIPTION_NODEGROUP_ID,
+    PRN_NODE_ID,
+    REF_NODEGROUP_ID,
+    SECOND_DESCRIPTION_NODE_ID,
+    SECOND_DESCRIPTION_NODEGROUP_ID,
+    SECOND_PRN_NODE_ID,
+    SECOND_REF_NODEGROUP_ID,
+    SECOND_TEST_MODEL_GRAPH_ID,
+    TEST_MODEL_GRAPH_ID,
+    load_test_graphs,
+)
+
+
+# These benchmarks can be run from the command line via:
+#     SYSREF_BENCHMARK=1 python manage.py test tests.benchmarks.concurrent_load_benchmarks --settings="tests.test_settings"
+# or if using Docker:
+#     SYSREF_BENCHMARK=1 python manage.py test tests.benchmarks.concurrent_load_benchmarks --settings="tests.test_settings_for_docker"
+#
+# SYSREF_LOAD_WORKERS sets the worker process counts to run with (default
+# 1,2,4,8) and SYSREF_LOAD_RESOURCES the resources each worker creates
+# (default 50).
+
+WORKER_COUNTS = get_env_list("SYSREF_LOAD_WORKERS", "1,2,4,8")
+RESOURCES_PER_WORKER = int(os.environ.get("SYSREF_LOAD_RESOURCES", 50))
+
+# (graph, description nodegroup, description node, System Reference nodegroup, PRN node)
+GRAPHS = [
+    (
+        TEST_MODEL_GRAPH_ID,
+        DESCRIPTION_NODEGROUP_ID,
+        DESCRIPTION_NODE_ID,
+        REF_NODEGROUP_ID,
+        PRN_NODE_ID,
+    ),
+    (
+        SECOND_TEST_MODEL_GRAPH_ID,
+        SECOND_DESCRIPTION_NODEGROUP_ID,
+        SECOND_DESCRIPTION_NODE_ID,
+        SECOND_REF_NODEGROUP_ID,
+        SECOND_PRN_NODE_ID,
+    ),
+]
+
+
+def create_resources(graph_id, nodegroup_id, node_id, count):
+    """
+    Creates count resources with a description tile, leaving the function to
+    add their System Reference tiles. Returns the latency of each save.
+    """
+    latencies = []
+    try:
+        for i in range(count):
+            resource = Resource(graph_id=graph_id)
+            resource.tiles.append(
+                Tile(
+                    data={node_id: {"en": {"value": f"Load {i}", "direction": "ltr"}}},
+                    nodegroup_id=nodegroup_id,
+                )
+            )
+            start = time.perf_counter()
+            resource.save()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        connections.close_all()
+    return latencies
+
+
+@skipUnless(BENCHMARKS_ENABLED, SKIP_REASON)
+class ConcurrentLoadBenchmark(TransactionTestCase):
+    """
+    Creates resources from several worker processes at once, each with its own
+    database connection, and checks that the references they end up with are
+    still unique and complete.
+    """
+
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        load_test_graphs()
+
+    def test_concurrent_resource_creation(self):
+        results = []
+        environment = get_environment()
+        for workers in WORKER_COUNTS:
+            latencies, elapsed = self.run_workers(workers)
+            self.assert_references_are_unique_and_complete()
+            results.append(
+                {
+                    "benchmark": "concurrent_load",
+                    "workers": workers,
+                    "saves": len(latencies),
+                    "elapsed_s": round(elapsed, 3),
+                    "saves_per_s": round(len(latencies) / elapsed, 2),
+                    "latency_ms": summarise(latencies),
+                    "environment": environment,
+                }
+            )
+        write_results(results)
+
+    def run_workers(self, workers):
+        # Workers are forked so that they inherit the test database settings,
+        # and must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(processes=workers) as pool:
+            start = time.perf_counter()
+            pending = [
+                pool.apply_async(
+                    create_resources,
+                    (graph_id, nodegroup_id, node_id, RESOURCES_PER_WORKER),
+                )
+                for graph_id, nodegroup_id, node_id, _, _ in (
+                    GRAPHS[i % len(GRAPHS)] for i in range(workers)
+                )
+            ]
+            latencies = [latency for result in pending for latency in result.get()]
+            elapsed = time.perf_counter() - start
+        return latencies, elapsed
+
+    def assert_references_are_unique_and_complete(self):
+        # Both graphs draw from the same sequence, so PRNs must be unique across them
+        prns = Counter()
+        for graph_id, _, _, ref_nodegroup_id, prn_node_id in GRAPHS:
+            ref_tiles = models.TileModel.objects.filter(nodegroup_id=ref_nodegroup_id)
+            ref_tile_counts = Counter(
+                str(resourceinstanceid)
+                for resourceinstanceid in ref_tiles.values_list(
+                    "resourceinstance_id", flat=True
+                )
+            )
+            resourceinstanceids = {
+                str(resourceinstanceid)
+                for resourceinstanceid in models.ResourceInstance.objects.filter(
+                    graph_id=graph_id
+                ).values_list("resourceinstanceid", flat=True)
+            }
+            self.assertEqual(set(ref_tile_counts), resourceinstanceids)
+            self.assertEqual(
+                [rid for rid, count in ref_tile_counts.items() if count != 1], []
+            )
+            for data in ref_tiles.values_list("data", flat=True):
+                prns[data[prn_node_id]] += 1
+
+        self.assertNotIn(None, prns)
+        self.assertEqual([prn for prn, count in prns.items() if count > 1], [])
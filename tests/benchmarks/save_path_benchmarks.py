@@ -0,0 +1,166 @@
+import os
+import time
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from arches.app.models import models
+from arches.app.models.graph import Graph
+from arches.app.models.resource import Resource
+from arches.app.models.tile import Tile
+from arches_he_sysref_funcs.references import allocation
+from arches_he_sysref_funcs.references.repair import (
+    assign_references,
+    assign_resource_references,
+    get_blank_reference_tile,
+)
+from tests.benchmarks import (
+    BENCHMARKS_ENABLED,
+    SKIP_REASON,
+    get_env_list,
+    get_environment,
+    summarise,
+    write_results,
+)
+from tests.generate_unique_references.graph_fixtures import (
+    DESCRIPTION_NODE_ID,
+    DESCRIPTION_NODEGROUP_ID,
+    REF_NODEGROUP_ID,
+    TEST_MODEL_GRAPH_ID,
+    load_test_graphs,
+)
+
+
+# These benchmarks can be run from the command line via:
+#     SYSREF_BENCHMARK=1 python manage.py test tests.benchmarks.save_path_benchmarks --settings="tests.test_settings"
+# or if using Docker:
+#     SYSREF_BENCHMARK=1 python manage.py test tests.benchmarks.save_path_benchmarks --settings="tests.test_settings_for_docker"
+#
+# SYSREF_BENCHMARK_SIZES sets the resource counts to measure at (default
+# 0,100,1000) and SYSREF_BENCHMARK_SAMPLE the number of saves timed per path
+# and size (default 25).
+
+SIZES = get_env_list("SYSREF_BENCHMARK_SIZES", "0,100,1000")
+SAMPLE = int(os.environ.get("SYSREF_BENCHMARK_SAMPLE", 25))
+POPULATE_BATCH_SIZE = 500
+
+
+@skipUnless(BENCHMARKS_ENABLED, SKIP_REASON)
+class SavePathBenchmark(TransactionTestCase):
+    """
+    Times each save path of the function, and counts its queries, as the
+    number of resources with references grows.
+    """
+
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        load_test_graphs()
+        self.graph = Graph.objects.get(pk=TEST_MODEL_GRAPH_ID)
+
+    def test_save_paths(self):
+        results = []
+        environment = get_environment()
+        paths = [
+            ("reference_nodegroup", self.prepare_reference_tile, self.save_tile),
+            ("existing_reference", self.prepare_existing_reference, self.save_tile),
+            ("missing_reference", self.prepare_missing_reference, self.save_tile),
+            ("sequence_bootstrap", self.prepare_bootstrap, self.bootstrap),
+        ]
+        for size in sorted(SIZES):
+            self.populate(size)
+            for path, prepare, run in paths:
+                latencies, queries = self.measure(prepare, run)
+                results.append(
+                    {
+                        "benchmark": "save_path",
+                        "path": path,
+                        "resources": size,
+                        "saves": len(latencies),
+                        "latency_ms": summarise(latencies),
+                        "queries": {
+                            "mean": round(sum(queries) / len(queries), 2),
+                            "max": max(queries),
+                        },
+                        "environment": environment,
+                    }
+                )
+        write_results(results)
+
+    def measure(self, prepare, run):
+        latencies = []
+        queries = []
+        for _ in range(SAMPLE):
+            prepared = prepare()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                run(prepared)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(context.captured_queries))
+        return latencies, queries
+
+    def populate(self, total):
+        """
+        Tops the Test Model up to total resources with complete references,
+        saved in bulk so that populating is not part of the measurements.
+        """
+        existing = models.ResourceInstance.objects.filter(graph=self.graph).count()
+        while existing < total:
+            resources = []
+            for _ in range(min(POPULATE_BATCH_SIZE, total - existing)):
+                resource = Resource(graph=self.graph)
+                resource.tiles.append(self.get_description_tile(resource))
+                resources.append(resource)
+            assign_resource_references(resources)
+            Resource.bulk_save(resources)
+            existing += len(resources)
+
+    def create_bare_resource(self):
+        resource = Resource(graph=self.graph)
+        resource.save()
+        return resource
+
+    def get_description_tile(self, resource):
+        return Tile(
+            data={
+                DESCRIPTION_NODE_ID: {"en": {"value": "Benchmark", "direction": "ltr"}}
+            },
+            nodegroup_id=DESCRIPTION_NODEGROUP_ID,
+            resourceinstance_id=resource.resourceinstanceid,
+        )
+
+    # A System Reference tile saved directly is completed in place
+    def prepare_reference_tile(self):
+        resource = self.create_bare_resource()
+        return get_blank_reference_tile(REF_NODEGROUP_ID, resource.resourceinstanceid)
+
+    # Another tile saved on a resource whose references are complete
+    def prepare_existing_reference(self):
+        resource = self.create_bare_resource()
+        ref_tile = get_blank_reference_tile(
+            REF_NODEGROUP_ID, resource.resourceinstanceid
+        )
+        assign_references([ref_tile])
+        ref_tile.save()
+        return self.get_description_tile(resource)
+
+    # Another tile saved on a resource without a System Reference tile
+    def prepare_missing_reference(self):
+        return self.get_description_tile(self.create_bare_resource())
+
+    def save_tile(self, tile):
+        tile.save()
+
+    # The first allocation after the sequence goes missing, including the
+    # seeding scan of the existing PRNs
+    def prepare_bootstrap(self):
+        allocation.known_sequences.clear()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DROP SEQUENCE IF EXISTS {allocation.SIMPLEID_SEQUENCE_NAME};"
+            )
+
+    def bootstrap(self, prepared):
+        allocation.fetch_simple_ids(1)
@@ -1,19 +1,34 @@
 import os
 import random
+import uuid
 import concurrent.futures
+from unittest import mock
 
+from django.contrib.auth.models import User
 from django.test import TransactionTestCase
 from arches.app.models.graph import Graph
 from arches.app.models import models
-from arches.app.utils.betterJSONSerializer import JSONDeserializer
-from arches.app.utils.data_management.resource_graphs.importer import (
-    import_graph as resource_graph_importer,
-)
-from django.contrib.auth.models import User
 from arches.app.models.resource import Resource
 from arches.app.models.tile import Tile
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.conf import settings
+from django.db import connection
+from arches_he_sysref_funcs.functions.generate_unique_references_function import (
+    GenerateUniqueReferences,
+)
+from arches_he_sysref_funcs.references import allocation
+from arches_he_sysref_funcs.references.allocation import allocate_prns
+from arches_he_sysref_funcs.references.repair import (
+    assign_resource_references,
+    populate_import_references,
+)
+from arches_he_sysref_funcs.utils.metadata_cache import metadata_cache
+from tests.generate_unique_references.graph_fixtures import (
+    DESCRIPTION_NODE_ID,
+    DESCRIPTION_NODEGROUP_ID,
+    load_test_graphs,
+)
 
 
 # These tests can be run from the command line via:
@@ -35,35 +50,7 @@ class TestGenerateUniqueReferencesFunction(TransactionTestCase):
 
     def setUp(self):
         super().setUp()
-
-        # Need to register function before the graphs are imported
-        source = os.path.join(
-            "arches_he_sysref_funcs",
-            "functions",
-            "generate_unique_references_function.py",
-        )
-
-        call_command("fn", "register", source=source)
-
-        admin = User.objects.get(username="admin")
-
-        # Import test_model graph
-        with open(
-            os.path.join("tests/fixtures/resource_graphs/test_model.json"), "r"
-        ) as f:
-            archesfile = JSONDeserializer().deserialize(f)
-        resource_graph_importer(archesfile["graph"])
-        graph = Graph.objects.get(graphid=self.test_model_graph_id)
-        graph.publish(user=admin)
-
-        # Import second_test_model graph
-        with open(
-            os.path.join("tests/fixtures/resource_graphs/second_test_model.json"), "r"
-        ) as f:
-            archesfile = JSONDeserializer().deserialize(f)
-        resource_graph_importer(archesfile["graph"])
-        graph = Graph.objects.get(graphid=self.second_test_model_graph_id)
-        graph.publish(user=admin)
+        load_test_graphs()
 
     def create_and_assert_resource(
         self, graph_id, tile_data, nodegroup_id, assert_prn=False
@@ -307,3 +294,619 @@ class TestGenerateUniqueReferencesFunction(TransactionTestCase):
             random.shuffle(test_methods)
             for test in test_methods:
                 test()
+
+    # Business data import: a batch of resources without System Reference tiles
+    # is completed in one pass, with consecutive PRNs from a single allocation.
+    def test_14_populate_import_references(self):
+        description_node_id = "7a9d1924-63f0-11f0-9f7e-460d1d596ee6"
+        description_nodegroup_id = "7a9d1226-63f0-11f0-9f7e-460d1d596ee6"
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+        resourceid_node_id = "7a9d162c-63f0-11f0-9f7e-460d1d596ee6"
+
+        resources = []
+        for _ in range(3):
+            resourceinstanceid = str(uuid.uuid4())
+            resources.append(
+                {
+                    "resourceinstance": {
+                        "resourceinstanceid": resourceinstanceid,
+                        "graph_id": self.test_model_graph_id,
+                        "legacyid": None,
+                    },
+                    "tiles": [
+                        {
+                            "tileid": str(uuid.uuid4()),
+                            "resourceinstance_id": resourceinstanceid,
+                            "nodegroup_id": description_nodegroup_id,
+                            "parenttile_id": None,
+                            "sortorder": 0,
+                            "provisionaledits": None,
+                            "data": {
+                                description_node_id: {
+                                    "en": {"value": "Imported", "direction": "ltr"}
+                                }
+                            },
+                        }
+                    ],
+                }
+            )
+
+        allocated = populate_import_references(resources)
+        self.assertEqual(allocated, 3)
+
+        for resource in resources:
+            ref_tiles = [
+                t for t in resource["tiles"] if t["nodegroup_id"] == ref_nodegroup_id
+            ]
+            self.assertEqual(len(ref_tiles), 1)
+            self.assertEqual(
+                ref_tiles[0]["data"][prn_node_id],
+                TestGenerateUniqueReferencesFunction.prn + self.initial_seed,
+            )
+            self.assertEqual(
+                ref_tiles[0]["data"][resourceid_node_id]["en"]["value"],
+                resource["resourceinstance"]["resourceinstanceid"],
+            )
+            TestGenerateUniqueReferencesFunction.prn += 1
+
+    # on_import completes a System Reference tile in place
+    def test_15_on_import_completes_reference_tile(self):
+        ref_nodegroup_id = "cb07f788-6249-11f0-8f24-96a8a23bc0be"
+        prn_node_id = "2a060860-624a-11f0-8f24-96a8a23bc0be"
+        resourceid_node_id = "b4d8a7a4-624a-11f0-8f24-96a8a23bc0be"
+        resourceinstanceid = str(uuid.uuid4())
+        tile = {
+            "tileid": str(uuid.uuid4()),
+            "resourceinstance_id": resourceinstanceid,
+            "nodegroup_id": ref_nodegroup_id,
+            "data": {
+                prn_node_id: None,
+                resourceid_node_id: {"en": {"value": "", "direction": "ltr"}},
+            },
+        }
+        config = models.FunctionXGraph.objects.get(
+            graph_id=self.second_test_model_graph_id
+        ).config
+
+        GenerateUniqueReferences(config, ref_nodegroup_id).on_import(tile)
+
+        self.assertTrue(str(tile["data"][prn_node_id]).isdigit())
+        self.assertEqual(
+            tile["data"][resourceid_node_id]["en"]["value"], resourceinstanceid
+        )
+
+
+class SysrefTransactionTestCase(TransactionTestCase):
+    """
+    Base for the tests that do not depend on the order they run in. Each test
+    starts from a fresh PRN sequence at PRIMARY_REFERENCE_NUMBER_INITIAL_SEED,
+    which is put back as it was afterwards so that the numbered tests above
+    keep counting from where they left off.
+    """
+
+    serialized_rollback = True
+
+    test_model_graph_id = "7a9d0a60-63f0-11f0-9f7e-460d1d596ee6"
+    second_test_model_graph_id = "41c228b2-b3ce-4174-9ed6-5632bded986c"
+
+    initial_seed = getattr(settings, "PRIMARY_REFERENCE_NUMBER_INITIAL_SEED", 1)
+
+    def setUp(self):
+        super().setUp()
+        load_test_graphs()
+        self.reset_prn_sequence()
+
+    def reset_prn_sequence(self):
+        sequence_name = allocation.SIMPLEID_SEQUENCE_NAME
+        with connection.cursor() as cursor:
+            next_value = (
+                allocation.get_sequence_next_value(cursor, sequence_name)
+                if allocation.relation_exists(cursor, sequence_name)
+                else None
+            )
+            cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence_name};")
+        self.clear_prn_state()
+        allocation.create_simpleid_nextval_sequence(start=self.initial_seed)
+        self.addCleanup(self.restore_prn_sequence, next_value)
+
+    def restore_prn_sequence(self, next_value):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DROP SEQUENCE IF EXISTS {allocation.SIMPLEID_SEQUENCE_NAME};"
+            )
+        if next_value is not None:
+            allocation.create_simpleid_nextval_sequence(start=next_value)
+        self.clear_prn_state()
+
+    def clear_prn_state(self):
+        # PRNs reserved or settings read before the reset must not be reused
+        allocation.known_sequences.clear()
+        allocation.prn_blocks.clear()
+        allocation.import_prn_blocks.clear()
+        metadata_cache.clear()
+
+    def create_resource(self):
+        """
+        Saves a Test Model resource with a description, which the function
+        gives a System Reference tile, and returns it.
+        """
+        resource = Resource(graph_id=self.test_model_graph_id)
+        resource.tiles.append(
+            Tile(
+                data={
+                    DESCRIPTION_NODE_ID: {
+                        "en": {"value": "Test Resource", "direction": "ltr"}
+                    }
+                },
+                nodegroup_id=DESCRIPTION_NODEGROUP_ID,
+            )
+        )
+        resource.save()
+        return resource
+
+
+class TestGenerateUniqueReferencesOperations(SysrefTransactionTestCase):
+    """
+    Commands and helpers built on the function.
+    """
+
+    # Resources saved before the function was bound get their System Reference
+    # tile from the backfill command
+    def test_backfill_sysrefs_command(self):
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+        resourceid_node_id = "7a9d162c-63f0-11f0-9f7e-460d1d596ee6"
+        resource = self.create_resource()
+        models.TileModel.objects.filter(
+            resourceinstance=resource, nodegroup_id=ref_nodegroup_id
+        ).delete()
+
+        call_command("backfill_sysrefs", dry_run=True, stdout=open(os.devnull, "w"))
+        self.assertFalse(
+            models.TileModel.objects.filter(
+                resourceinstance=resource, nodegroup_id=ref_nodegroup_id
+            ).exists()
+        )
+
+        call_command("backfill_sysrefs", stdout=open(os.devnull, "w"))
+        ref_tile = models.TileModel.objects.get(
+            resourceinstance=resource, nodegroup_id=ref_nodegroup_id
+        )
+        self.assertTrue(str(ref_tile.data[prn_node_id]).isdigit())
+        self.assertEqual(
+            ref_tile.data[resourceid_node_id]["en"]["value"],
+            str(resource.resourceinstanceid),
+        )
+
+    # Saving another tile repairs an existing System Reference tile whose
+    # ResourceID has been corrupted, and leaves a complete one untouched
+    def test_other_tile_save_repairs_incomplete_reference_tile(self):
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+        resourceid_node_id = "7a9d162c-63f0-11f0-9f7e-460d1d596ee6"
+        description_node_id = "7a9d1924-63f0-11f0-9f7e-460d1d596ee6"
+        description_nodegroup_id = "7a9d1226-63f0-11f0-9f7e-460d1d596ee6"
+
+        resource = self.create_resource()
+        ref_tile = models.TileModel.objects.get(
+            resourceinstance=resource, nodegroup_id=ref_nodegroup_id
+        )
+        prn = ref_tile.data[prn_node_id]
+
+        def save_description():
+            tile = Tile(
+                data={
+                    description_node_id: {
+                        "en": {"value": "Another description", "direction": "ltr"}
+                    }
+                },
+                nodegroup_id=description_nodegroup_id,
+                resourceinstance_id=resource.resourceinstanceid,
+            )
+            tile.save()
+
+        save_description()
+        ref_tile.refresh_from_db()
+        self.assertEqual(ref_tile.data[prn_node_id], prn)
+
+        ref_tile.data[resourceid_node_id] = {
+            "en": {"value": "not a uuid", "direction": "ltr"}
+        }
+        ref_tile.save()
+
+        save_description()
+        ref_tile.refresh_from_db()
+        self.assertEqual(ref_tile.data[prn_node_id], prn)
+        self.assertEqual(
+            ref_tile.data[resourceid_node_id]["en"]["value"],
+            str(resource.resourceinstanceid),
+        )
+
+    # With direct writes the reference tile is inserted without a nested
+    # Tile.save(), and an edit log entry is still recorded for it
+    def test_direct_reference_tile_writes(self):
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+
+        def get_setting(name, default=None):
+            return True if name == "SYSREF_DIRECT_TILE_WRITES" else default
+
+        with (
+            mock.patch(
+                "arches_he_sysref_funcs.functions.generate_unique_references_function.get_setting",
+                side_effect=get_setting,
+            ),
+            mock.patch.object(Tile, "index") as index,
+        ):
+            resource = self.create_resource()
+
+        ref_tile = models.TileModel.objects.get(
+            resourceinstance=resource, nodegroup_id=ref_nodegroup_id
+        )
+        self.assertTrue(str(ref_tile.data[prn_node_id]).isdigit())
+        self.assertTrue(
+            models.EditLog.objects.filter(
+                tileinstanceid=str(ref_tile.tileid), edittype="tile create"
+            ).exists()
+        )
+        index.assert_not_called()
+
+    def test_save_phases_are_timed(self):
+        from arches_he_sysref_funcs.utils import instrumentation
+
+        sink = instrumentation.InMemorySink()
+        with mock.patch.object(instrumentation, "get_timing_sink", return_value=sink):
+            self.create_resource()
+
+        summary = sink.summary()
+        for phase in ("save", "reference_state", "allocate", "reference_tile_write"):
+            self.assertIn(phase, summary)
+        self.assertEqual(summary["reference_state"]["queries"], 1)
+        self.assertGreaterEqual(
+            summary["save"]["queries"], summary["reference_tile_write"]["queries"]
+        )
+
+    def test_audit_sysrefs_command(self):
+        import io
+        import json
+
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+        resourceid_node_id = "7a9d162c-63f0-11f0-9f7e-460d1d596ee6"
+        for _ in range(5):
+            self.create_resource()
+        ref_tiles = list(
+            models.TileModel.objects.filter(nodegroup_id=ref_nodegroup_id).order_by(
+                "resourceinstance_id"
+            )
+        )
+        duplicate, original, mismatched, missing, invalid = ref_tiles
+
+        duplicate.data[prn_node_id] = original.data[prn_node_id]
+        duplicate.save()
+        mismatched.data[resourceid_node_id]["en"]["value"] = str(uuid.uuid4())
+        mismatched.save()
+        invalid.data[prn_node_id] = "abc"
+        invalid.save()
+        missing.delete()
+
+        stdout = io.StringIO()
+        call_command(
+            "audit_sysrefs",
+            format="jsonl",
+            graphs=[self.test_model_graph_id],
+            stdout=stdout,
+            stderr=io.StringIO(),
+        )
+        found = {
+            (row["check"], row["resourceinstanceid"])
+            for row in map(json.loads, stdout.getvalue().splitlines())
+        }
+        self.assertEqual(
+            found,
+            {
+                ("duplicate_prn", str(duplicate.resourceinstance_id)),
+                ("duplicate_prn", str(original.resourceinstance_id)),
+                ("mismatched_resourceid", str(mismatched.resourceinstance_id)),
+                ("invalid_prn", str(invalid.resourceinstance_id)),
+                ("missing_reference_tile", str(missing.resourceinstance_id)),
+            },
+        )
+
+    # PRNs and ResourceIDs are resolved in order, a chunk per query
+    def test_resolve_references(self):
+        from arches_he_sysref_funcs.references.registry import resolve_references
+
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+        for _ in range(3):
+            self.create_resource()
+        tiles = list(models.TileModel.objects.filter(nodegroup_id=ref_nodegroup_id))
+        prns = [tile.data[prn_node_id] for tile in tiles]
+        resourceids = {
+            tile.data[prn_node_id]: str(tile.resourceinstance_id) for tile in tiles
+        }
+
+        values = prns + [max(prns) + 1000]
+        with self.assertNumQueries(2):
+            results = list(resolve_references(values, chunk_size=2))
+        self.assertEqual(
+            [(result["prn"], result["found"]) for result in results],
+            [(prn, True) for prn in prns] + [(max(prns) + 1000, False)],
+        )
+        self.assertEqual(
+            [result.get("resourceinstanceid") for result in results[:3]],
+            [resourceids[prn] for prn in prns],
+        )
+
+        results = list(
+            resolve_references(
+                list(resourceids.values()) + ["not-a-uuid"], by="resourceinstanceid"
+            )
+        )
+        self.assertEqual([result["found"] for result in results], [True] * 3 + [False])
+        self.assertEqual([result["prn"] for result in results[:3]], list(resourceids))
+
+    def test_sysref_indexes_command(self):
+        from io import StringIO
+
+        stale = allocation.get_prn_index_name(uuid.uuid4())
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE INDEX {stale} ON tiles (tileid);")
+        call_command("sysref_indexes", stdout=StringIO())
+
+        names = {
+            allocation.get_prn_index_name(simpleid_node)
+            for simpleid_node, _ in allocation.get_prn_nodes()
+        }
+        states = allocation.get_prn_index_states()
+        self.assertEqual(set(states), names)
+        self.assertTrue(all(states.values()))
+
+        out = StringIO()
+        call_command("sysref_indexes", stdout=out)
+        self.assertIn("up to date", out.getvalue())
+
+
+class TestPrnAllocation(SysrefTransactionTestCase):
+    """
+    Allocating PRNs, and creating, dropping and resyncing the sequences they
+    are drawn from.
+    """
+
+    # PRNs can be allocated in bulk and assigned to unsaved resources
+    def test_allocate_and_assign_references(self):
+        prns = allocate_prns(5)
+        self.assertEqual(len(prns), 5)
+        self.assertEqual(prns, sorted(set(prns)))
+        self.assertEqual(allocate_prns(0), [])
+
+        ref_nodegroup_id = "cb07f788-6249-11f0-8f24-96a8a23bc0be"
+        prn_node_id = "2a060860-624a-11f0-8f24-96a8a23bc0be"
+        graph = Graph.objects.get(pk=self.second_test_model_graph_id)
+        resources = [Resource(graph=graph) for _ in range(3)]
+
+        changed = assign_resource_references(resources)
+
+        self.assertEqual(len(changed), 3)
+        assigned = [
+            tile.data[prn_node_id]
+            for resource in resources
+            for tile in resource.tiles
+            if str(tile.nodegroup_id) == ref_nodegroup_id
+        ]
+        self.assertEqual(len(assigned), 3)
+        self.assertTrue(all(prn > prns[-1] for prn in assigned))
+        self.assertEqual(len(set(assigned)), 3)
+
+    def test_concurrent_sequence_bootstrap(self):
+        from django.db import connections
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DROP SEQUENCE IF EXISTS {allocation.SIMPLEID_SEQUENCE_NAME};"
+            )
+        allocation.known_sequences.clear()
+
+        def allocate():
+            try:
+                return allocate_prns(3)
+            finally:
+                connections.close_all()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: allocate(), range(4)))
+
+        prns = [prn for result in results for prn in result]
+        self.assertEqual(len(prns), 12)
+        self.assertEqual(len(set(prns)), 12)
+
+    def test_named_and_per_graph_sequences(self):
+        ref_nodegroup_id = "cb07f788-6249-11f0-8f24-96a8a23bc0be"
+        config = {
+            "simpleuid_node": "2a060860-624a-11f0-8f24-96a8a23bc0be",
+            "uniqueresource_nodegroup": ref_nodegroup_id,
+        }
+        self.assertEqual(
+            allocation.get_sequence_name(config), allocation.SIMPLEID_SEQUENCE_NAME
+        )
+        with mock.patch.object(allocation, "get_setting", return_value=True):
+            self.assertEqual(
+                allocation.get_sequence_name(config),
+                f"sysref_prn_{ref_nodegroup_id.replace('-', '')}_seq",
+            )
+        self.assertEqual(
+            allocation.get_sequence_name(
+                {**config, "sequence_name": "sysref_test_seq"}
+            ),
+            "sysref_test_seq",
+        )
+        with self.assertRaises(ValueError):
+            allocation.get_sequence_name({**config, "sequence_name": "bad; name"})
+
+        # A named sequence nothing draws from yet is created on first use
+        prns = allocate_prns(3, "sysref_test_seq")
+        self.assertEqual(len(prns), 3)
+        self.assertEqual(prns, sorted(set(prns)))
+        with connection.cursor() as cursor:
+            self.assertTrue(allocation.relation_exists(cursor, "sysref_test_seq"))
+            cursor.execute("DROP SEQUENCE sysref_test_seq;")
+        allocation.known_sequences.discard("sysref_test_seq")
+
+    def test_counter_table_allocator(self):
+        from django.db import connections
+
+        allocator = allocation.CounterTableAllocator(shards=3)
+        first = allocator.allocate(4, "sysref_test_counter")
+        self.assertEqual(len(set(first)), 4)
+
+        def allocate():
+            try:
+                return allocator.allocate(5, "sysref_test_counter")
+            finally:
+                connections.close_all()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: allocate(), range(8)))
+
+        prns = first + [prn for result in results for prn in result]
+        self.assertEqual(len(prns), 44)
+        self.assertEqual(len(set(prns)), 44)
+        self.assertTrue(all(prn >= self.initial_seed for prn in prns))
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {allocation.PRN_COUNTER_TABLE};")
+
+    def test_resync_sysref_sequences_command(self):
+        import io
+
+        for _ in range(3):
+            self.create_resource()
+        highest = allocate_prns(1)[0]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT setval(%s, 1, false);", [allocation.SIMPLEID_SEQUENCE_NAME]
+            )
+
+        stdout = io.StringIO()
+        call_command("resync_sysref_sequences", dry_run=True, stdout=stdout)
+        self.assertIn("would be moved", stdout.getvalue())
+        self.assertEqual(allocation.resync_sequence(dry_run=True)[0], 1)
+
+        stdout = io.StringIO()
+        call_command("resync_sysref_sequences", stdout=stdout)
+        self.assertIn("closing a gap", stdout.getvalue())
+        # The PRN allocated above was never stored, so it may be handed out again
+        self.assertGreaterEqual(allocate_prns(1)[0], highest)
+
+        stdout = io.StringIO()
+        call_command("resync_sysref_sequences", stdout=stdout)
+        self.assertIn("already past the highest PRN", stdout.getvalue())
+
+        # Sequences not used for allocation are not resynced
+        with mock.patch(
+            "arches_he_sysref_funcs.management.commands.resync_sysref_sequences.get_allocator",
+            return_value=allocation.CounterTableAllocator(),
+        ):
+            with self.assertRaises(CommandError):
+                call_command("resync_sysref_sequences", stdout=io.StringIO())
+
+    # Every System Reference tile written by the function gets a registry row
+    # in the same transaction, and the registry can be rebuilt from the tiles
+    def test_sysref_registry(self):
+        import io
+        from arches_he_sysref_funcs.models import SysrefRegistry
+
+        ref_nodegroup_id = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+        prn_node_id = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+        for _ in range(3):
+            self.create_resource()
+
+        def get_expected():
+            return {
+                (
+                    str(tile.tileid),
+                    int(tile.data[prn_node_id]),
+                    str(tile.resourceinstance_id),
+                )
+                for tile in models.TileModel.objects.filter(
+                    nodegroup_id=ref_nodegroup_id
+                )
+            }
+
+        def get_registered():
+            return {
+                (str(row.tile_id), row.prn, str(row.resourceinstanceid))
+                for row in SysrefRegistry.objects.filter(
+                    graphid=self.test_model_graph_id
+                )
+            }
+
+        self.assertEqual(get_registered(), get_expected())
+
+        # Editing the PRN moves the registry row with it
+        tile = Tile.objects.filter(nodegroup_id=ref_nodegroup_id).first()
+        tile.data[prn_node_id] = allocate_prns(1)[0]
+        tile.save()
+        self.assertEqual(get_registered(), get_expected())
+
+        # A PRN changed to one registered to another tile stops resolving to
+        # this tile rather than keeping its old row
+        other = (
+            Tile.objects.filter(nodegroup_id=ref_nodegroup_id)
+            .exclude(pk=tile.tileid)
+            .first()
+        )
+        tile.data[prn_node_id] = other.data[prn_node_id]
+        tile.save()
+        self.assertFalse(SysrefRegistry.objects.filter(tile_id=tile.tileid).exists())
+        self.assertEqual(
+            SysrefRegistry.objects.get(tile_id=other.tileid).prn,
+            other.data[prn_node_id],
+        )
+        tile.data[prn_node_id] = allocate_prns(1)[0]
+        tile.save()
+        self.assertEqual(get_registered(), get_expected())
+
+        # A provisional edit is not registered until it is approved
+        registered_prn = tile.data[prn_node_id]
+        tile.data[prn_node_id] = allocate_prns(1)[0]
+        tile.save(
+            user=User.objects.create_user(
+                username="sysref_provisional", password="sysref_provisional"
+            )
+        )
+        self.assertEqual(
+            SysrefRegistry.objects.get(tile_id=tile.tileid).prn, registered_prn
+        )
+
+        SysrefRegistry.objects.all().delete()
+        stdout = io.StringIO()
+        call_command("build_sysref_registry", stdout=stdout)
+        self.assertIn(
+            f"{self.test_model_graph_id}: registered 3 references", stdout.getvalue()
+        )
+        self.assertEqual(get_registered(), get_expected())
+
+        # Deleting the tile drops its registry row
+        tile.delete()
+        self.assertFalse(SysrefRegistry.objects.filter(tile_id=tile.tileid).exists())
+
+    def test_dropped_sequence_inside_transaction(self):
+        from django.db import transaction
+
+        first = allocation.fetch_simple_ids(2, "sysref_test_seq")
+        self.assertIn("sysref_test_seq", allocation.known_sequences)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("DROP SEQUENCE sysref_test_seq;")
+            # The sequence is recreated without aborting the transaction
+            values = allocation.fetch_simple_ids(2, "sysref_test_seq")
+            self.assertEqual(len(values), 2)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+        self.assertEqual(len(first), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("DROP SEQUENCE sysref_test_seq;")
+        allocation.known_sequences.discard("sysref_test_seq")
@@ -0,0 +1,58 @@
+import os
+
+from arches.app.models.graph import Graph
+from arches.app.utils.betterJSONSerializer import JSONDeserializer
+from arches.app.utils.data_management.resource_graphs.importer import (
+    import_graph as resource_graph_importer,
+)
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+
+TEST_MODEL_GRAPH_ID = "7a9d0a60-63f0-11f0-9f7e-460d1d596ee6"
+SECOND_TEST_MODEL_GRAPH_ID = "41c228b2-b3ce-4174-9ed6-5632bded986c"
+
+# Test Model nodes
+DESCRIPTION_NODEGROUP_ID = "7a9d1226-63f0-11f0-9f7e-460d1d596ee6"
+DESCRIPTION_NODE_ID = "7a9d1924-63f0-11f0-9f7e-460d1d596ee6"
+REF_NODEGROUP_ID = "7a9d0cfe-63f0-11f0-9f7e-460d1d596ee6"
+PRN_NODE_ID = "7a9d1e6a-63f0-11f0-9f7e-460d1d596ee6"
+RESOURCEID_NODE_ID = "7a9d162c-63f0-11f0-9f7e-460d1d596ee6"
+
+# Second Test Model nodes
+SECOND_DESCRIPTION_NODEGROUP_ID = "6799975e-63c7-11f0-9d19-62c8cdfa6e19"
+SECOND_DESCRIPTION_NODE_ID = "25ec1592-63c8-11f0-b057-62c8cdfa6e19"
+SECOND_REF_NODEGROUP_ID = "cb07f788-6249-11f0-8f24-96a8a23bc0be"
+SECOND_PRN_NODE_ID = "2a060860-624a-11f0-8f24-96a8a23bc0be"
+SECOND_RESOURCEID_NODE_ID = "b4d8a7a4-624a-11f0-8f24-96a8a23bc0be"
+
+
+def load_test_graphs():
+    """
+    Registers the Generate Unique References function and imports and
+    publishes the Test Model and Second Test Model graphs, which have it bound.
+    """
+
+    # Need to register function before the graphs are imported
+    source = os.path.join(
+        "arches_he_sysref_funcs",
+        "functions",
+        "generate_unique_references_function.py",
+    )
+
+    call_command("fn", "register", source=source)
+
+    admin = User.objects.get(username="admin")
+
+    for path, graph_id in (
+        ("tests/fixtures/resource_graphs/test_model.json", TEST_MODEL_GRAPH_ID),
+        (
+            "tests/fixtures/resource_graphs/second_test_model.json",
+            SECOND_TEST_MODEL_GRAPH_ID,
+        ),
+    ):
+        with open(os.path.join(path), "r") as f:
+            archesfile = JSONDeserializer().deserialize(f)
+        resource_graph_importer(archesfile["graph"])
+        graph = Graph.objects.get(graphid=graph_id)
+        graph.publish(user=admin)
@@ -0,0 +1,70 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.references import allocation
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.generate_unique_references.prn_allocator_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.generate_unique_references.prn_allocator_tests --settings="tests.test_settings_for_docker"
+
+
+def fake_settings(**values):
+    return mock.patch.object(
+        allocation,
+        "get_setting",
+        side_effect=lambda name, default=None: values.get(name, default),
+    )
+
+
+class TestPrimaryReferenceNumberAllocators(SimpleTestCase):
+    def tearDown(self):
+        allocation._allocators.clear()
+
+    def test_in_memory_allocator_counts_per_sequence(self):
+        allocator = allocation.InMemoryAllocator()
+        with fake_settings(PRIMARY_REFERENCE_NUMBER_INITIAL_SEED=100):
+            self.assertEqual(allocator.allocate(3, "a"), [100, 101, 102])
+            self.assertEqual(allocator.allocate(2, "a"), [103, 104])
+            self.assertEqual(allocator.allocate(1, "b"), [100])
+            allocator.clear()
+            self.assertEqual(allocator.allocate(1, "a"), [100])
+
+    def test_in_memory_allocator_is_unique_across_threads(self):
+        allocator = allocation.InMemoryAllocator()
+        results = []
+
+        def worker():
+            for _ in range(50):
+                results.extend(allocator.allocate(3, "a"))
+
+        with fake_settings():
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(results), 1200)
+        self.assertEqual(len(set(results)), 1200)
+
+    def test_allocator_is_selected_by_setting(self):
+        with fake_settings():
+            self.assertIsInstance(
+                allocation.get_allocator(), allocation.SequenceAllocator
+            )
+        with fake_settings(SYSREF_PRN_ALLOCATOR="memory"):
+            allocator = allocation.get_allocator()
+            self.assertIsInstance(allocator, allocation.InMemoryAllocator)
+            # The same instance is kept, so counters survive cache clears
+            self.assertIs(allocation.get_allocator(), allocator)
+            self.assertEqual(allocation.allocate_prns(2), [1, 2])
+            self.assertEqual(allocation.allocate_prns(0), [])
+        with fake_settings(
+            SYSREF_PRN_ALLOCATOR="arches_he_sysref_funcs.references.allocation.InMemoryAllocator"
+        ):
+            self.assertIsInstance(
+                allocation.get_allocator(), allocation.InMemoryAllocator
+            )
@@ -0,0 +1,65 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.references.allocation import PrimaryReferenceNumberBlock
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.generate_unique_references.prn_block_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.generate_unique_references.prn_block_tests --settings="tests.test_settings_for_docker"
+
+
+class TestPrimaryReferenceNumberBlock(SimpleTestCase):
+    def setUp(self):
+        self.next_value = 1
+        self.fetch_calls = 0
+
+    def fetch(self, size):
+        self.fetch_calls += 1
+        values = list(range(self.next_value, self.next_value + size))
+        self.next_value += size
+        return values
+
+    def test_hands_out_block_before_refilling(self):
+        block = PrimaryReferenceNumberBlock()
+        values = [block.take(5, self.fetch) for _ in range(12)]
+        self.assertEqual(values, list(range(1, 13)))
+        self.assertEqual(self.fetch_calls, 3)
+
+    def test_values_are_unique_across_threads(self):
+        block = PrimaryReferenceNumberBlock()
+        results = []
+
+        def worker():
+            for _ in range(50):
+                results.append(block.take(7, self.fetch))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 400)
+        self.assertEqual(len(set(results)), 400)
+
+    def test_forked_process_discards_parent_block(self):
+        block = PrimaryReferenceNumberBlock()
+        self.assertEqual(block.take(10, self.fetch), 1)
+        with mock.patch("os.getpid", return_value=-1):
+            self.assertEqual(block.take(10, self.fetch), 11)
+        self.assertEqual(self.fetch_calls, 2)
+
+    def test_ramped_block_doubles_up_to_size(self):
+        block = PrimaryReferenceNumberBlock(ramp=True)
+        sizes = []
+
+        def fetch(size):
+            sizes.append(size)
+            return self.fetch(size)
+
+        values = [block.take(4, fetch) for _ in range(15)]
+        self.assertEqual(values, list(range(1, 16)))
+        self.assertEqual(sizes, [1, 2, 4, 4, 4])
@@ -0,0 +1,160 @@
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.test import TransactionTestCase
+from arches.app.models import models
+from arches.app.models.resource import Resource
+from arches.app.models.tile import Tile
+from arches_he_sysref_funcs.functions import (
+    generate_unique_references_function as sysref,
+)
+from arches_he_sysref_funcs.references import allocation, registry
+from arches_he_sysref_funcs.references.allocation import (
+    allocate_prns,
+    is_valid_prn,
+    prn_blocks,
+)
+from arches_he_sysref_funcs.references.config import get_reference_nodegroup_graph
+from arches_he_sysref_funcs.references.repair import (
+    assign_references,
+    get_blank_reference_data,
+    get_blank_reference_tile,
+    get_default_language_direction,
+)
+from arches_he_sysref_funcs.utils import instrumentation, profiling
+from tests.generate_unique_references.graph_fixtures import (
+    DESCRIPTION_NODE_ID,
+    DESCRIPTION_NODEGROUP_ID,
+    REF_NODEGROUP_ID,
+    TEST_MODEL_GRAPH_ID,
+    load_test_graphs,
+)
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.generate_unique_references.query_budget_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.generate_unique_references.query_budget_tests --settings="tests.test_settings_for_docker"
+
+
+class TestSaveQueryBudgets(TransactionTestCase):
+    """
+    Pins the number of queries GenerateUniqueReferences.save() issues on each
+    path, once the sequence and metadata are cached as they are in a running
+    worker. A change that adds a round trip to one of these paths should
+    update its budget deliberately.
+    """
+
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        load_test_graphs()
+        config = models.FunctionXGraph.objects.get(graph_id=TEST_MODEL_GRAPH_ID).config
+        self.function = sysref.GenerateUniqueReferences(config, REF_NODEGROUP_ID)
+
+        # Warm the per-process caches a running worker would already have
+        allocate_prns(1)
+        get_default_language_direction()
+        get_blank_reference_data([REF_NODEGROUP_ID])
+        get_reference_nodegroup_graph(REF_NODEGROUP_ID)
+        prn_blocks.clear()
+
+    @contextmanager
+    def patch_settings(self, **values):
+        # The profiling and timing wrappers around save() read their settings
+        # too, so they are patched along with the function's and its helpers'
+        # lookups
+        def get_setting(name, default=None):
+            return values.get(name, default)
+
+        with ExitStack() as stack:
+            for module in (sysref, allocation, registry, profiling, instrumentation):
+                stack.enter_context(
+                    mock.patch.object(module, "get_setting", side_effect=get_setting)
+                )
+            yield
+
+    def create_resource(self):
+        resource = Resource(graph_id=TEST_MODEL_GRAPH_ID)
+        resource.save()
+        return resource
+
+    def get_reference_tile(self, resource):
+        return get_blank_reference_tile(REF_NODEGROUP_ID, resource.resourceinstanceid)
+
+    def get_description_tile(self, resource):
+        return Tile(
+            data={DESCRIPTION_NODE_ID: {"en": {"value": "Budget", "direction": "ltr"}}},
+            nodegroup_id=DESCRIPTION_NODEGROUP_ID,
+            resourceinstance_id=resource.resourceinstanceid,
+        )
+
+    def test_reference_nodegroup_save_costs_one_nextval(self):
+        tile = self.get_reference_tile(self.create_resource())
+        with self.patch_settings(), self.assertNumQueries(1):
+            self.function.save(tile, None)
+        self.assertTrue(is_valid_prn(tile.data[self.function.config["simpleuid_node"]]))
+
+    def test_complete_reference_tile_save_costs_nothing(self):
+        tile = self.get_reference_tile(self.create_resource())
+        assign_references([tile])
+        with self.patch_settings(), self.assertNumQueries(0):
+            self.function.save(tile, None)
+
+    def test_reference_tile_post_save_costs_registry_write(self):
+        tile = self.get_reference_tile(self.create_resource())
+        assign_references([tile])
+        Tile.objects.bulk_create([tile])
+        # Registry delete and insert
+        with self.patch_settings(), self.assertNumQueries(2):
+            self.function.post_save(tile, None)
+
+    def test_reference_nodegroup_saves_share_a_block(self):
+        tiles = [self.get_reference_tile(self.create_resource()) for _ in range(5)]
+        with self.patch_settings(PRIMARY_REFERENCE_NUMBER_BLOCK_SIZE=5):
+            with self.assertNumQueries(1):
+                for tile in tiles:
+                    self.function.save(tile, None)
+
+    def test_triggering_save_with_complete_references_costs_one_query(self):
+        resource = self.create_resource()
+        ref_tile = self.get_reference_tile(resource)
+        assign_references([ref_tile])
+        ref_tile.save()
+
+        tile = self.get_description_tile(resource)
+        with self.patch_settings(), self.assertNumQueries(1):
+            self.function.save(tile, None)
+
+    def test_triggering_save_creating_reference_tile(self):
+        resource = self.create_resource()
+        tile = self.get_description_tile(resource)
+        # Reference tile check, nextval, tile insert, edit log insert, registry
+        # delete and insert
+        with self.patch_settings(SYSREF_DIRECT_TILE_WRITES=True):
+            with self.assertNumQueries(6):
+                self.function.save(tile, None)
+        self.assertEqual(
+            models.TileModel.objects.filter(
+                resourceinstance_id=resource.resourceinstanceid,
+                nodegroup_id=REF_NODEGROUP_ID,
+            ).count(),
+            1,
+        )
+
+    def test_triggering_save_repairing_reference_tile(self):
+        resource = self.create_resource()
+        ref_tile = self.get_reference_tile(resource)
+        Tile.objects.bulk_create([ref_tile])
+
+        tile = self.get_description_tile(resource)
+        # Reference tile check, tile load, nextval, tile update, edit log
+        # insert, registry delete and insert
+        with self.patch_settings(SYSREF_DIRECT_TILE_WRITES=True):
+            with self.assertNumQueries(7):
+                self.function.save(tile, None)
+        ref_tile.refresh_from_db()
+        self.assertTrue(
+            is_valid_prn(ref_tile.data[self.function.config["simpleuid_node"]])
+        )
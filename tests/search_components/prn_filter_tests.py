@@ -0,0 +1,113 @@
+import json
+from unittest import mock
+from unittest.mock import Mock
+
+from arches_he_sysref_funcs.search_components.prn_filter import (
+    PrnFilter,
+    parse_prn_query,
+)
+from django.test import TestCase
+
+
+# these tests can be run from the command line via
+# python manage.py test tests.search_components.prn_filter_tests --settings="tests.test_settings"
+# or if using docker
+# python manage.py test tests.search_components.prn_filter_tests --settings="tests.test_settings_for_docker"
+
+CONFIGS = {
+    "test_graph_id": {"uniqueresource_nodegroup": "ref_nodegroup"},
+    "second_graph_id": {"uniqueresource_nodegroup": "second_ref_nodegroup"},
+}
+
+
+class TestParsePrnQuery(TestCase):
+    def test_values_and_ranges(self):
+        self.assertEqual(
+            parse_prn_query("1001, 1005 2100 - 2000;3000-3001"),
+            ([1001, 1005], [(2000, 2100), (3000, 3001)]),
+        )
+
+    def test_empty_query(self):
+        self.assertEqual(parse_prn_query("  "), ([], []))
+
+    def test_invalid_token(self):
+        with self.assertRaises(ValueError):
+            parse_prn_query("1001, abc")
+
+    def test_prn_above_exact_double_range(self):
+        self.assertEqual(parse_prn_query(str(2**53)), ([2**53], []))
+        with self.assertRaises(ValueError):
+            parse_prn_query(str(2**53 + 1))
+        with self.assertRaises(ValueError):
+            parse_prn_query(f"1-{2**53 + 1}")
+
+
+@mock.patch(
+    "arches_he_sysref_funcs.search_components.prn_filter.get_function_configs_by_graph",
+    return_value=CONFIGS,
+)
+class TestPrnFilter(TestCase):
+    def append_dsl(self, querystring, **kwargs):
+        search_query_object = {"query": Mock()}
+        PrnFilter(request=Mock()).append_dsl(
+            search_query_object, querystring=json.dumps(querystring), **kwargs
+        )
+        calls = search_query_object["query"].add_query.call_args_list
+        return calls[0].args[0].dsl if calls else None
+
+    def get_number_filter(self, dsl, clause="filter"):
+        nested = dsl["bool"][clause][0]["nested"]
+        self.assertEqual(nested["path"], "numbers")
+        return nested["query"]["bool"]
+
+    def test_values_and_ranges_compile_to_terms_and_range(self, get_configs):
+        dsl = self.append_dsl({"query": "1001, 1002, 2000-2100"})
+
+        number_filter = self.get_number_filter(dsl)
+        prn_query = number_filter["must"][0]["bool"]
+        self.assertEqual(
+            prn_query["should"],
+            [
+                {"terms": {"numbers.number": [1001, 1002]}},
+                {"range": {"numbers.number": {"gte": 2000, "lte": 2100}}},
+            ],
+        )
+        self.assertEqual(
+            number_filter["filter"],
+            [
+                {
+                    "terms": {
+                        "numbers.nodegroup_id": [
+                            "ref_nodegroup",
+                            "second_ref_nodegroup",
+                        ]
+                    }
+                }
+            ],
+        )
+
+    def test_inverted_filter_excludes_matches(self, get_configs):
+        dsl = self.append_dsl({"query": "1001", "inverted": True})
+
+        self.assertNotIn("filter", dsl["bool"])
+        self.get_number_filter(dsl, clause="must_not")
+
+    def test_filter_is_limited_to_permitted_nodegroups(self, get_configs):
+        dsl = self.append_dsl(
+            {"query": "1001"}, permitted_nodegroups=["ref_nodegroup", "other"]
+        )
+
+        number_filter = self.get_number_filter(dsl)
+        self.assertEqual(
+            number_filter["filter"],
+            [{"terms": {"numbers.nodegroup_id": ["ref_nodegroup"]}}],
+        )
+
+    def test_provisional_numbers_are_excluded(self, get_configs):
+        dsl = self.append_dsl({"query": "1001"}, include_provisional=False)
+
+        number_filter = self.get_number_filter(dsl)
+        self.assertIn("must_not", number_filter)
+
+    def test_empty_query_adds_nothing(self, get_configs):
+        self.assertIsNone(self.append_dsl({"query": ""}))
@@ -0,0 +1,101 @@
+from unittest import mock
+from unittest.mock import Mock
+
+from arches_he_sysref_funcs.search_indexes import bulk_reindex
+from django.test import TestCase
+
+
+# these tests can be run from the command line via
+# python manage.py test tests.search_indexes.bulk_reindex_tests --settings="tests.test_settings"
+# or if using docker
+# python manage.py test tests.search_indexes.bulk_reindex_tests --settings="tests.test_settings_for_docker"
+
+
+class TestBulkReindex(TestCase):
+    def get_index(self, **hooks):
+        index = Mock(spec=["se", "index_name", "get_documents_to_index", *hooks])
+        index.index_name = "test_index"
+        index.se.create_bulk_item.side_effect = lambda index, id, data: (id, data)
+        index.get_documents_to_index.side_effect = lambda resource, tiles: (
+            ({"tiles": len(tiles)}, resource.resourceinstanceid)
+            if resource.graph_id == "indexed_graph"
+            else (None, None)
+        )
+        for name, value in hooks.items():
+            setattr(index, name, Mock(return_value=value))
+        return index
+
+    def test_graphids_are_limited_to_those_of_the_index(self):
+        index = self.get_index(get_graphids_to_index=["graph_a", "graph_b"])
+
+        self.assertEqual(bulk_reindex.get_index_graphids(index), ["graph_a", "graph_b"])
+        self.assertEqual(
+            bulk_reindex.get_index_graphids(index, ["graph_b", "graph_c"]),
+            ["graph_b"],
+        )
+
+    @mock.patch.object(bulk_reindex.helpers, "bulk", return_value=(1, 0))
+    @mock.patch.object(bulk_reindex.models.TileModel, "objects")
+    def test_index_chunk_loads_tiles_once_and_sends_one_bulk_request(
+        self, tile_objects, bulk
+    ):
+        index = self.get_index(get_nodegroups_to_index=["ref_nodegroup"])
+        tiles = tile_objects.filter.return_value.filter.return_value
+        tiles.__iter__.return_value = [
+            Mock(resourceinstance_id="r1"),
+            Mock(resourceinstance_id="r1"),
+        ]
+
+        result = bulk_reindex.index_chunk(
+            (None, "test_index", [("r1", "indexed_graph"), ("r2", "other_graph")]),
+            index,
+        )
+
+        self.assertEqual(result, (1, 0))
+        tile_objects.filter.assert_called_once_with(
+            resourceinstance_id__in=["r1", "r2"]
+        )
+        tile_objects.filter.return_value.filter.assert_called_once_with(
+            nodegroup_id__in=["ref_nodegroup"]
+        )
+        bulk.assert_called_once_with(
+            index.se.es,
+            [("r1", {"tiles": 2})],
+            raise_on_error=False,
+            stats_only=True,
+        )
+
+    @mock.patch.object(bulk_reindex.helpers, "bulk")
+    @mock.patch.object(bulk_reindex.models.TileModel, "objects")
+    def test_index_chunk_without_documents_sends_nothing(self, tile_objects, bulk):
+        index = self.get_index()
+        tile_objects.filter.return_value.__iter__.return_value = []
+
+        result = bulk_reindex.index_chunk(
+            (None, "test_index", [("r2", "other_graph")]), index
+        )
+
+        self.assertEqual(result, (0, 0))
+        bulk.assert_not_called()
+
+    @mock.patch.object(bulk_reindex, "index_chunk", side_effect=[(2, 0), (1, 1)])
+    @mock.patch.object(
+        bulk_reindex, "get_resource_chunks", return_value=iter([["c1"], ["c2"]])
+    )
+    def test_reindex_reports_progress_per_chunk(self, get_chunks, index_chunk):
+        index = self.get_index(get_graphids_to_index=["graph_a"])
+        index.delete_index = Mock()
+        index.prepare_index = Mock()
+        progress = Mock()
+
+        indexed, failed, _ = bulk_reindex.reindex(
+            index, chunk_size=10, progress=progress
+        )
+
+        self.assertEqual((indexed, failed), (3, 1))
+        get_chunks.assert_called_once_with(["graph_a"], 10)
+        index.prepare_index.assert_called_once()
+        self.assertEqual(
+            [call.args[:2] for call in progress.call_args_list], [(2, 0), (3, 1)]
+        )
+        index.se.refresh.assert_called_once_with(index="test_index")
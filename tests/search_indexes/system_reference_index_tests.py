@@ -0,0 +1,75 @@
+from unittest import mock
+from unittest.mock import Mock
+
+from arches_he_sysref_funcs.search_indexes.system_reference_index import (
+    SystemReferenceIndex,
+)
+from django.test import TestCase
+
+
+# these tests can be run from the command line via
+# python manage.py test tests.search_indexes.system_reference_index_tests --settings="tests.test_settings"
+# or if using docker
+# python manage.py test tests.search_indexes.system_reference_index_tests --settings="tests.test_settings_for_docker"
+
+CONFIGS = {
+    "test_graph_id": {
+        "simpleuid_node": "prn_node",
+        "resourceid_node": "resourceid_node",
+        "uniqueresource_nodegroup": "ref_nodegroup",
+        "sequence_name": "",
+    }
+}
+
+
+@mock.patch(
+    "arches_he_sysref_funcs.search_indexes.system_reference_index.get_function_configs_by_graph",
+    return_value=CONFIGS,
+)
+class TestSystemReferenceIndex(TestCase):
+    def test_prepare_index(self, get_configs):
+        index = SystemReferenceIndex(index_name="System References")
+        with mock.patch.object(index.se, "create_index"):
+            index.prepare_index()
+
+        properties = index.index_metadata["mappings"]["properties"]
+        self.assertEqual(properties["prn"], {"type": "long"})
+        self.assertEqual(properties["resourceid"], {"type": "keyword"})
+
+    def test_get_documents_to_index(self, get_configs):
+        index = SystemReferenceIndex(index_name="System References")
+        resourceinstance = Mock(graph_id="test_graph_id", resourceinstanceid="r1")
+        tiles = [
+            Mock(nodegroup_id="other_nodegroup", data={"prn_node": "1"}),
+            Mock(
+                nodegroup_id="ref_nodegroup",
+                data={
+                    "prn_node": "1000042",
+                    "resourceid_node": {"en": {"value": "r1", "direction": "ltr"}},
+                },
+            ),
+        ]
+
+        document, doc_id = index.get_documents_to_index(resourceinstance, tiles)
+
+        self.assertEqual(doc_id, "r1")
+        self.assertEqual(document["prn"], 1000042)
+        self.assertEqual(document["resourceid"], "r1")
+        self.assertEqual(document["graphid"], "test_graph_id")
+
+    def test_invalid_prn_is_not_indexed(self, get_configs):
+        index = SystemReferenceIndex(index_name="System References")
+        resourceinstance = Mock(graph_id="test_graph_id", resourceinstanceid="r1")
+        tiles = [Mock(nodegroup_id="ref_nodegroup", data={"prn_node": "abc"})]
+
+        document, _ = index.get_documents_to_index(resourceinstance, tiles)
+
+        self.assertIsNone(document["prn"])
+
+    def test_graph_without_function_is_skipped(self, get_configs):
+        index = SystemReferenceIndex(index_name="System References")
+        resourceinstance = Mock(graph_id="other_graph_id")
+
+        self.assertEqual(
+            index.get_documents_to_index(resourceinstance, []), (None, None)
+        )
@@ -0,0 +1,39 @@
+import threading
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.utils.instance_registry import InstanceRegistry
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.utils.instance_registry_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.utils.instance_registry_tests --settings="tests.test_settings_for_docker"
+
+
+class TestInstanceRegistry(SimpleTestCase):
+    def test_instance_is_built_once_per_key(self):
+        registry = InstanceRegistry()
+        first = registry.get("a", object)
+        self.assertIs(registry.get("a", object), first)
+        self.assertIsNot(registry.get("b", object), first)
+
+    def test_clear_drops_instances(self):
+        registry = InstanceRegistry()
+        first = registry.get("a", object)
+        registry.clear()
+        self.assertIsNot(registry.get("a", object), first)
+
+    def test_concurrent_callers_share_an_instance(self):
+        registry = InstanceRegistry()
+        results = []
+
+        def worker():
+            results.append(registry.get("a", object))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(result) for result in results}), 1)
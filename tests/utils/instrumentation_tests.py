@@ -0,0 +1,77 @@
+import socket
+from unittest import mock
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.utils import instrumentation
+from arches_he_sysref_funcs.utils.instrumentation import (
+    InMemorySink,
+    StatsdSink,
+    timed,
+    timed_phase,
+)
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.utils.instrumentation_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.utils.instrumentation_tests --settings="tests.test_settings_for_docker"
+
+
+class TestInstrumentation(SimpleTestCase):
+    def setUp(self):
+        self.sink = InMemorySink()
+
+    def test_disabled_timing_is_a_shared_no_op(self):
+        with mock.patch.object(instrumentation, "get_timing_sink", return_value=None):
+            self.assertIs(timed("a"), timed("b"))
+            with timed("a"):
+                pass
+        self.assertEqual(self.sink.summary(), {})
+
+    def test_phases_are_aggregated(self):
+        with mock.patch.object(
+            instrumentation, "get_timing_sink", return_value=self.sink
+        ):
+            for _ in range(3):
+                with timed("outer"):
+                    with timed("inner"):
+                        pass
+
+            @timed_phase("decorated")
+            def decorated():
+                return 42
+
+            self.assertEqual(decorated(), 42)
+
+        summary = self.sink.summary()
+        self.assertEqual(summary["outer"]["count"], 3)
+        self.assertEqual(summary["inner"]["count"], 3)
+        self.assertEqual(summary["decorated"]["count"], 1)
+        self.assertEqual(summary["outer"]["queries"], 0)
+        self.assertGreaterEqual(summary["outer"]["max_ms"], summary["inner"]["max_ms"])
+
+        self.sink.clear()
+        self.assertEqual(self.sink.summary(), {})
+
+    def test_phase_is_recorded_when_block_raises(self):
+        with mock.patch.object(
+            instrumentation, "get_timing_sink", return_value=self.sink
+        ):
+            with self.assertRaises(ValueError):
+                with timed("failing"):
+                    raise ValueError
+        self.assertEqual(self.sink.summary()["failing"]["count"], 1)
+
+    def test_statsd_sink_sends_timer_and_query_count(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(5)
+        self.addCleanup(server.close)
+
+        sink = StatsdSink(*server.getsockname(), prefix="test")
+        sink.record("nextval", 0.0015, 1)
+
+        payload = server.recv(1024).decode()
+        self.assertEqual(
+            payload, "test.nextval.time:1.500|ms\ntest.nextval.queries:1|c"
+        )
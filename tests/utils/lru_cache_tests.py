@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.utils.lru_cache import LRUCache
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.utils.lru_cache_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.utils.lru_cache_tests --settings="tests.test_settings_for_docker"
+
+
+class TestLRUCache(SimpleTestCase):
+    def test_get_returns_set_value(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = LRUCache(2, timeout=60)
+        with mock.patch("time.monotonic", return_value=1000):
+            cache.set("a", 1)
+        with mock.patch("time.monotonic", return_value=1059):
+            self.assertEqual(cache.get("a"), 1)
+        with mock.patch("time.monotonic", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_zero_size_disables_cache(self):
+        cache = LRUCache(0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.utils.metadata_cache import MetadataCache
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.utils.metadata_cache_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.utils.metadata_cache_tests --settings="tests.test_settings_for_docker"
+
+
+class TestMetadataCache(SimpleTestCase):
+    def setUp(self):
+        self.cache = MetadataCache()
+        self.cache._timeout = 60
+        self.loader = mock.Mock(side_effect=lambda: object())
+
+    def test_get_loads_once(self):
+        first = self.cache.get("key", self.loader)
+        second = self.cache.get("key", self.loader)
+        self.assertIs(first, second)
+        self.loader.assert_called_once()
+
+    def test_clear_reloads(self):
+        first = self.cache.get("key", self.loader)
+        self.cache.clear()
+        self.cache._timeout = 60
+        second = self.cache.get("key", self.loader)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_entries_expire(self):
+        with mock.patch("time.monotonic", return_value=1000):
+            self.cache.get("key", self.loader)
+        with mock.patch("time.monotonic", return_value=1059):
+            self.cache.get("key", self.loader)
+        self.loader.assert_called_once()
+        with mock.patch("time.monotonic", return_value=1061):
+            self.cache.get("key", self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_no_timeout_never_expires(self):
+        self.cache._timeout = None
+        with mock.patch("time.monotonic", return_value=0):
+            self.cache.get("key", self.loader)
+        with mock.patch("time.monotonic", return_value=10**9):
+            self.cache.get("key", self.loader)
+        self.loader.assert_called_once()
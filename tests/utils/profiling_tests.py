@@ -0,0 +1,72 @@
+import os
+import pstats
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from arches_he_sysref_funcs.utils import profiling
+from arches_he_sysref_funcs.utils.profiling import profiled
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.utils.profiling_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.utils.profiling_tests --settings="tests.test_settings_for_docker"
+
+
+@profiled(
+    lambda resourceinstanceid, nodegroupid, nested=False: (
+        resourceinstanceid,
+        nodegroupid,
+    )
+)
+def save(resourceinstanceid, nodegroupid, nested=False):
+    if nested:
+        save("nested-resource", "nested-nodegroup")
+    return sum(range(1000))
+
+
+class TestProfiling(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def patch_settings(self, **values):
+        return mock.patch.object(
+            profiling,
+            "get_setting",
+            side_effect=lambda name, default=None: values.get(name, default),
+        )
+
+    def test_disabled_without_directory(self):
+        with self.patch_settings():
+            self.assertEqual(save("resource", "nodegroup"), 499500)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profile_is_written_with_ids_in_name(self):
+        with self.patch_settings(SYSREF_PROFILE_DIR=self.directory):
+            self.assertEqual(save("resource", "nodegroup"), 499500)
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 1)
+        self.assertIn("_resource_nodegroup_", names[0])
+        stats = pstats.Stats(os.path.join(self.directory, names[0]))
+        self.assertTrue(stats.total_calls > 0)
+
+    def test_sample_rate_and_threshold(self):
+        with self.patch_settings(
+            SYSREF_PROFILE_DIR=self.directory, SYSREF_PROFILE_SAMPLE_RATE=0
+        ):
+            save("resource", "nodegroup")
+        with self.patch_settings(
+            SYSREF_PROFILE_DIR=self.directory, SYSREF_PROFILE_THRESHOLD_MS=60000
+        ):
+            save("resource", "nodegroup")
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_nested_calls_are_left_to_the_outer_profile(self):
+        with self.patch_settings(SYSREF_PROFILE_DIR=self.directory):
+            save("resource", "nodegroup", nested=True)
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 1)
+        self.assertIn("_resource_nodegroup_", names[0])
@@ -0,0 +1,210 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from guardian.shortcuts import assign_perm
+from arches.app.models import models
+from arches.app.models.resource import Resource
+from arches.app.models.tile import Tile
+from arches.app.search.mappings import RESOURCES_INDEX
+from arches.app.search.search_engine_factory import SearchEngineFactory
+from arches_he_sysref_funcs.references import registry
+from arches_he_sysref_funcs.references.allocation import SIMPLEID_SEQUENCE_NAME
+from tests.generate_unique_references.graph_fixtures import (
+    DESCRIPTION_NODE_ID,
+    DESCRIPTION_NODEGROUP_ID,
+    PRN_NODE_ID,
+    REF_NODEGROUP_ID,
+    TEST_MODEL_GRAPH_ID,
+    load_test_graphs,
+)
+
+
+# These tests can be run from the command line via:
+#     python manage.py test tests.views.sysref_resolve_tests --settings="tests.test_settings"
+# or if using Docker:
+#     python manage.py test tests.views.sysref_resolve_tests --settings="tests.test_settings_for_docker"
+
+
+class TestResolvePrnView(TransactionTestCase):
+
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        load_test_graphs()
+        registry._resolve_caches.clear()
+        self.client.login(username="admin", password="admin")
+        self.resource, self.prn = self.create_resource()
+
+    def create_resource(self):
+        resource = Resource(graph_id=TEST_MODEL_GRAPH_ID)
+        resource.tiles.append(
+            Tile(
+                data={
+                    DESCRIPTION_NODE_ID: {
+                        "en": {"value": "Resolve", "direction": "ltr"}
+                    }
+                },
+                nodegroup_id=DESCRIPTION_NODEGROUP_ID,
+            )
+        )
+        resource.save()
+        prn = Tile.objects.get(
+            resourceinstance_id=resource.resourceinstanceid,
+            nodegroup_id=REF_NODEGROUP_ID,
+        ).data[PRN_NODE_ID]
+        return resource, prn
+
+    def login_with_restricted_resource(self):
+        """
+        Logs in as a user who is not a superuser and has no access to a
+        second resource, and returns that resource and its PRN.
+        """
+        user = User.objects.create_user(
+            username="sysref_reader", password="sysref_reader"
+        )
+        restricted, restricted_prn = self.create_resource()
+        assign_perm(
+            "no_access_to_resourceinstance",
+            user,
+            models.ResourceInstance.objects.get(pk=restricted.resourceinstanceid),
+        )
+        # Instance restrictions are read from the resource index
+        Resource.objects.get(pk=restricted.resourceinstanceid).index()
+        SearchEngineFactory().create().refresh(index=RESOURCES_INDEX)
+
+        self.client.logout()
+        self.client.login(username="sysref_reader", password="sysref_reader")
+        return restricted, restricted_prn
+
+    def bulk_resolve(self, data, by="prn"):
+        response = self.client.post(
+            reverse("sysref_bulk_resolve") + f"?by={by}",
+            data=data,
+            content_type="text/plain",
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+
+    def test_resolves_prn_to_resource(self):
+        response = self.client.get(reverse("sysref_resolve", args=[self.prn]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["resourceinstanceid"],
+            str(self.resource.resourceinstanceid),
+        )
+        self.assertEqual(response.json()["graphid"], TEST_MODEL_GRAPH_ID)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("max-age", response["Cache-Control"])
+
+    def test_matching_etag_is_not_modified(self):
+        url = reverse("sysref_resolve", args=[self.prn])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            registry.resolve_prn(self.prn)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_prn_is_not_found(self):
+        response = self.client.get(reverse("sysref_resolve", args=[self.prn + 10**6]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_sequence_filter(self):
+        response = self.client.get(
+            reverse("sysref_resolve", args=[self.prn]), {"sequence": "other_seq"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_resolve_streams_jsonl(self):
+        unknown = self.prn + 10**6
+        response = self.client.post(
+            reverse("sysref_bulk_resolve") + "?by=prn",
+            data=f'{self.prn}\n{unknown}\nabc\n"unterminated\n',
+            content_type="text/plain",
+        )
+        self.assertEqual(response.status_code, 200)
+        results = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            results,
+            [
+                {
+                    "prn": self.prn,
+                    "resourceinstanceid": str(self.resource.resourceinstanceid),
+                    "graphid": TEST_MODEL_GRAPH_ID,
+                    "sequence_name": SIMPLEID_SEQUENCE_NAME,
+                    "found": True,
+                },
+                {"prn": str(unknown), "found": False},
+                {"prn": "abc", "found": False},
+                {"prn": '"unterminated', "found": False},
+            ],
+        )
+
+    def test_bulk_resolve_by_resourceinstanceid(self):
+        response = self.client.post(
+            reverse("sysref_bulk_resolve") + "?by=resourceinstanceid",
+            data=f"{self.resource.resourceinstanceid}\n",
+            content_type="text/plain",
+        )
+        result = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(result["prn"], self.prn)
+        self.assertTrue(result["found"])
+
+    def test_non_superuser_resolves_readable_resource_only(self):
+        _, restricted_prn = self.login_with_restricted_resource()
+
+        response = self.client.get(reverse("sysref_resolve", args=[self.prn]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["resourceinstanceid"],
+            str(self.resource.resourceinstanceid),
+        )
+        response = self.client.get(reverse("sysref_resolve", args=[restricted_prn]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_non_superuser_bulk_resolves_readable_resource_only(self):
+        restricted, restricted_prn = self.login_with_restricted_resource()
+
+        results = self.bulk_resolve(f"{self.prn}\n{restricted_prn}\n")
+        self.assertTrue(results[0]["found"])
+        self.assertEqual(
+            results[0]["resourceinstanceid"], str(self.resource.resourceinstanceid)
+        )
+        self.assertEqual(results[1:], [{"prn": str(restricted_prn), "found": False}])
+
+        results = self.bulk_resolve(
+            f"{self.resource.resourceinstanceid}\n{restricted.resourceinstanceid}\n",
+            by="resourceinstanceid",
+        )
+        self.assertEqual([result["found"] for result in results], [True, False])
+
+    def test_bulk_resolve_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username="admin", password="admin")
+        response = client.post(
+            reverse("sysref_bulk_resolve") + "?by=prn",
+            data=f"{self.prn}\n",
+            content_type="text/plain",
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_resolve_requires_plain_text(self):
+        response = self.client.post(
+            reverse("sysref_bulk_resolve") + "?by=prn",
+            data={"prn": self.prn},
+        )
+        self.assertEqual(response.status_code, 415)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_bulk_resolve_streams_body_over_upload_limit(self):
+        results = self.bulk_resolve(f"{self.prn}\n" * 500)
+        self.assertEqual(len(results), 500)
+        self.assertTrue(all(result["found"] for result in results))